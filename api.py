@@ -0,0 +1,278 @@
+"""
+JSON API for race data.
+
+Every response carries a strong ETag derived from the fingerprint of the
+data behind it, answers If-None-Match with 304 and is compressed with brotli
+or gzip when the client accepts it. Serialized and compressed bodies are
+cached per (path, fingerprint, encoding), so a repeat poll costs one small
+fingerprint query.
+"""
+import gzip
+import json
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+
+from cache import ResponseCache
+from compare import KINDS, compare
+from export import EXPORT_MODELS, FORMATS, export_filename, iter_export, pa
+from models import Race, RaceResult, FastestLap, PitStop, GridPosition
+from pitstops import race_pit_stops, season_pit_stops
+from search import KINDS as SEARCH_KINDS, result_to_dict, search_index
+from simulator import monte_carlo, rules_from_args, what_if
+from utils import data_version, race_fingerprint, race_seasons
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# URL segment -> model holding that dataset
+DATASET_MODELS = {
+    'results': RaceResult,
+    'fastest-laps': FastestLap,
+    'pit-stops': PitStop,
+    'grid': GridPosition,
+}
+
+response_cache = ResponseCache()
+
+
+def race_to_dict(race):
+    """Serialize a Race row for the API."""
+    return {
+        'id': race.id,
+        'name': race.name,
+        'folder_name': race.folder_name,
+        'race_number': race.race_number,
+        'circuit_name': race.circuit_name,
+        'date': race.date.isoformat() if race.date else None,
+        'season': race.season,
+    }
+
+
+def negotiate_encoding():
+    """Pick the best content coding the client accepts: br, gzip or none."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Compress a body with the given content coding."""
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def cached_json_response(fingerprint, build, args=()):
+    """
+    Return a conditional, compressed JSON response for a fingerprinted payload.
+
+    build is only called when no serialized body for this fingerprint is
+    cached yet. args names the query string arguments the endpoint reads;
+    any others are left out of the cache key, so they cannot evict real
+    entries.
+    """
+    encoding = negotiate_encoding()
+    etag = fingerprint if encoding is None else f'{fingerprint}-{encoding}'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        read = tuple((name, tuple(request.args.getlist(name))) for name in args)
+        key = (request.path, read, fingerprint)
+        body = response_cache.get(key + (encoding,))
+        if body is None:
+            raw = response_cache.get(key + (None,))
+            if raw is None:
+                raw = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+                response_cache.set(key + (None,), raw)
+            body = raw
+            if encoding is not None:
+                body = compress(raw, encoding)
+                response_cache.set(key + (encoding,), body)
+        response = Response(body, mimetype='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api.route('/races')
+def races():
+    """List every race, or one season's races with ?season=<year>."""
+    season = request.args.get('season', type=int)
+
+    def build():
+        query = Race.query
+        if season is not None:
+            query = query.filter_by(season=season)
+        return [race_to_dict(race)
+                for race in query.order_by(Race.season, Race.race_number).all()]
+
+    return cached_json_response(data_version(season), build, args=('season',))
+
+
+@api.route('/race/<int:race_id>/<dataset>')
+def race_dataset(race_id, dataset):
+    """Return one dataset of a race in the shape of the source YAML."""
+    model = DATASET_MODELS.get(dataset)
+    if model is None:
+        abort(404)
+    fingerprint = race_fingerprint(race_id)
+    if fingerprint is None:
+        abort(404)
+
+    def build():
+        rows = model.query.filter_by(race_id=race_id).order_by(model.id).all()
+        return [row.to_dict() for row in rows]
+
+    return cached_json_response(fingerprint, build)
+
+
+@api.route('/race/<int:race_id>/pit-stops/analysis')
+def race_pit_stop_analysis(race_id):
+    """Stop time distributions, strategies and stop laps of one race."""
+    fingerprint = race_fingerprint(race_id)
+    if fingerprint is None:
+        abort(404)
+    return cached_json_response(fingerprint, lambda: race_pit_stops(race_id))
+
+
+@api.route('/pit-stops/<int:season>')
+def season_pit_stop_analysis(season):
+    """Stop time distributions, strategies and stop laps of a season, with a row per race."""
+    if season not in race_seasons():
+        abort(404)
+    return cached_json_response(data_version(season), lambda: season_pit_stops(season))
+
+
+@api.route('/compare/<kind>')
+def compare_entities(kind):
+    """
+    Compare two drivers or constructors: /api/compare/drivers?a=<id>&b=<id>,
+    optionally limited to one season with &season=<year>.
+    """
+    if kind not in KINDS:
+        abort(404)
+    a = request.args.get('a', '')
+    b = request.args.get('b', '')
+    season = request.args.get('season', type=int)
+    if a == b:
+        return jsonify(error='a and b must be different'), 400
+
+    def build():
+        # Only found comparisons are cached, so a cache hit needs no check
+        comparison = compare(kind, a, b, season)
+        if comparison is None:
+            abort(404)
+        return comparison
+
+    return cached_json_response(data_version(season), build, args=('a', 'b', 'season'))
+
+
+# Query arguments read by _what_if_request
+WHAT_IF_ARGS = ('season', 'system', 'points', 'fastest_lap', 'best')
+
+
+def _what_if_request(kind):
+    """Return the season and Rules of a what-if request; 404s unknown kinds and seasons."""
+    if kind not in KINDS:
+        abort(404)
+    seasons = race_seasons()
+    season = request.args.get('season', type=int, default=seasons[0] if seasons else None)
+    if season not in seasons:
+        abort(404)
+    return season, rules_from_args(request.args)
+
+
+@api.route('/what-if/<kind>')
+def what_if_standings(kind):
+    """
+    A season's drivers' or constructors' standings under other rules:
+    ?season=<year>&system=<1991|2003|2010|2019|...> or &points=25,18,15,...,
+    plus &fastest_lap=<points> and &best=<results counted>. The defaults
+    (system 2019, with its fastest-lap point) give the real standings.
+    """
+    try:
+        season, rules = _what_if_request(kind)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return cached_json_response(data_version(season), lambda: {
+        'season': season, 'rules': rules._asdict(), 'standings': what_if(season, rules, kind)},
+        args=WHAT_IF_ARGS)
+
+
+@api.route('/what-if/<kind>/monte-carlo')
+def what_if_monte_carlo(kind):
+    """
+    Championship odds when each classified finisher retires with
+    probability dnf_rate: the what-if arguments plus &dnf_rate=0.1,
+    &trials=<n> and &seed=<n> (the same seed gives the same answer).
+    """
+    try:
+        season, rules = _what_if_request(kind)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    trials = min(request.args.get('trials', 10000, type=int), current_app.config['SIMULATION_MAX_TRIALS'])
+    dnf_rate = request.args.get('dnf_rate', 0.1, type=float)
+    seed = request.args.get('seed', 0, type=int)
+    if not 0 <= dnf_rate <= 1 or trials < 1:
+        return jsonify(error='dnf_rate must be within 0-1 and trials positive'), 400
+    return cached_json_response(data_version(season), lambda: {
+        'season': season, 'rules': rules._asdict(), 'trials': trials, 'dnf_rate': dnf_rate, 'seed': seed,
+        'standings': monte_carlo(season, rules, trials, dnf_rate, kind, seed)},
+        args=WHAT_IF_ARGS + ('trials', 'dnf_rate', 'seed'))
+
+
+@api.route('/search')
+def search_entities():
+    """
+    Typeahead search: /api/search?q=<text>, optionally &limit=<n> and
+    &kind=driver|constructor|race|circuit.
+    """
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), current_app.config['SEARCH_MAX_RESULTS'])
+    kind = request.args.get('kind')
+    kinds = (kind,) if kind in SEARCH_KINDS else None
+    search_index.ensure()
+    return cached_json_response(search_index.version, lambda: [
+        result_to_dict(result) for result in search_index.search(query, limit, kinds)],
+        args=('q', 'limit', 'kind'))
+
+
+@api.route('/export/<dataset>')
+def export_dataset(dataset):
+    """
+    Stream a dataset for one season (?season=<year>) or every season as CSV,
+    or as Parquet with ?format=parquet.
+    """
+    model = EXPORT_MODELS.get(dataset)
+    fmt = request.args.get('format', 'csv')
+    if model is None or fmt not in FORMATS:
+        abort(404)
+    if fmt == 'parquet' and pa is None:
+        return jsonify(error='parquet export is not available on this server'), 501
+    season = request.args.get('season', type=int)
+
+    # No Content-Length: the body goes out chunked as rows are encoded
+    response = Response(stream_with_context(iter_export(model, fmt, season)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="{export_filename(dataset, fmt, season)}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api.errorhandler(404)
+def not_found(e):
+    return jsonify(error='not found'), 404
@@ -1,9 +1,70 @@
+import hashlib
+import math
 import os
-from flask import Flask, render_template, redirect, url_for, flash, request, session, jsonify
+from functools import wraps
+from flask import Flask, Response, render_template, redirect, url_for, flash, request, session, jsonify, abort, make_response
 from config import Config
-from models import db, Race
-from utils import load_races_data, load_race_results, load_fastest_laps, load_pit_stops, load_grid_positions
+from models import db, Race, RaceManifest, upgrade_schema, backfill_times
+from cache import race_cache, page_cache
+from snapshot import ensure_snapshot, folder_hashes, snapshot_path
+from utils import load_races_data, backfill_race_summaries, data_version, race_fingerprint, race_seasons
+from standings import driver_standings, constructor_standings
+from pitstops import race_pit_stops, season_pit_stops
+from compare import KINDS, comparison_index, compare
+from search import KINDS as SEARCH_KINDS, result_url, search, search_index
+from simulator import DEFAULT_POINTS_SYSTEM, POINTS_SYSTEM_LABELS, monte_carlo, rules_from_args, what_if
+from timeparse import format_ms
+from api import api, response_cache
+from watcher import RacesWatcher
+import assets
+import metrics
+
+
+def templates_version(app):
+    """Return a fingerprint of the template files and built assets, so a deploy invalidates cached pages."""
+    digest = hashlib.sha1()
+    template_folder = os.path.join(app.root_path, app.template_folder)
+    for root, _, files in sorted(os.walk(template_folder)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f'{root}/{name}:{stat.st_mtime_ns}:{stat.st_size}'.encode('utf-8'))
+    # Pages link the fingerprinted images named in the asset build manifest
+    digest.update(repr(assets.asset_manifest.build).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_page(version, args=()):
+    """
+    Cache a view's rendered HTML under (route, args, data version).
 
+    version is called with the view's arguments and returns the data version
+    of the page, or None to bypass the cache. args names the query string
+    arguments the view reads; any others are left out of the key, so they
+    cannot fill the cache with copies of the same page. Responses carry an
+    X-Cache header of HIT, HIT-DISK or MISS.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            data_version = version(**kwargs)
+            if data_version is None:
+                return view(**kwargs)
+
+            key = (request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple((name, tuple(request.args.getlist(name))) for name in args))
+            body, tier = page_cache.get(key, data_version)
+            if body is not None:
+                response = Response(body, mimetype='text/html')
+                response.headers['X-Cache'] = 'HIT' if tier == 'memory' else 'HIT-DISK'
+                return response
+
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                page_cache.set(key, data_version, response.get_data())
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
 
 
 def create_app(config_class=Config):
@@ -24,7 +85,14 @@ def create_app(config_class=Config):
 
     # Initialize extensions
     db.init_app(app)
-
+    race_cache.resize(app.config['RACE_CACHE_SIZE'])
+    response_cache.max_bytes = app.config['API_CACHE_BYTES']
+    search_index.check_interval = app.config['SEARCH_CHECK_INTERVAL']
+    page_cache.configure(app.config['PAGE_CACHE_BYTES'], app.config['PAGE_CACHE_DIR'],
+                         app.config['PAGE_CACHE_DIR_BYTES'])
+    app.register_blueprint(api)
+    metrics.init_app(app)
+    assets.init_app(app)
 
     # Ensure the instance folder exists
     os.makedirs(app.instance_path, exist_ok=True)
@@ -32,10 +100,46 @@ def create_app(config_class=Config):
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgraded = upgrade_schema()
+        if any(column.endswith('_ms') for column in upgraded):
+            # Parse the time strings of rows ingested before the *_ms columns existed
+            backfill_times()
+        if 'race_result.points' in upgraded:
+            # Points stored while the column was an integer may have lost their
+            # fractions: have the next sync re-ingest every race folder
+            RaceManifest.query.update({'content_hash': ''})
+            db.session.commit()
+        # Summarize races ingested before the race_summary table existed
+        backfill_race_summaries()
         # Load race data
         races_folder = app.config['RACES_FOLDER']
-        if os.path.exists(races_folder):
-            load_races_data(races_folder)
+        if app.config['INGEST_ON_STARTUP'] and os.path.exists(races_folder):
+            hashes = folder_hashes(races_folder)
+            load_races_data(races_folder, hashes)
+            if app.config['USE_SNAPSHOT']:
+                ensure_snapshot(races_folder, snapshot_path(app), hashes)
+            search_index.refresh()
+
+    # Hot-reload race folders without restarting workers
+    if app.config['WATCH_RACES'] and os.path.exists(app.config['RACES_FOLDER']):
+        watcher = RacesWatcher(app, app.config['WATCH_INTERVAL'])
+        watcher.start()
+        app.extensions['races_watcher'] = watcher
+
+    templates = templates_version(app)
+    app.add_template_filter(format_ms, 'ms')
+
+    def selected_season(seasons, season=None):
+        """Return the season from the URL or query string, defaulting to the newest."""
+        if season is None:
+            season = request.args.get('season', type=int)
+        if season in seasons:
+            return season
+        return seasons[0] if seasons else app.config['DEFAULT_SEASON']
+
+    def dashboard_version(season=None, **kwargs):
+        seasons = race_seasons()
+        return (templates, tuple(seasons), data_version(selected_season(seasons, season)))
 
     @app.route('/')
     def home():
@@ -47,59 +151,178 @@ def create_app(config_class=Config):
         return render_template('home.html')
 
 
+    # Season, sort and page can also be path segments, so every dashboard
+    # page has a plain URL that freeze.py can write out as a static file
     @app.route('/dashboard')
-    def dashboard():
+    @app.route('/dashboard/<int:season>/<any(race_number, name):sort>/', defaults={'page': 1})
+    @app.route('/dashboard/<int:season>/<any(race_number, name):sort>/<int:page>/')
+    @cached_page(dashboard_version, args=('season', 'sort', 'page'))
+    def dashboard(season=None, sort=None, page=None):
         """
         Dashboard page route.
 
-        Displays the main dashboard with a list of races.
-        Races can be sorted by different criteria.
+        Displays the main dashboard with one season's races, a page at a
+        time. Races can be sorted by different criteria.
 
         Returns:
             Rendered dashboard template with race data
         """
-        # Get sort parameter from query string
-        sort_by = request.args.get('sort', 'race_number')
+        # Get sort parameter from the URL or query string
+        sort_by = sort or request.args.get('sort', 'race_number')
 
         # Validate sort parameter
         if sort_by not in ['race_number', 'name']:
             sort_by = 'race_number'
 
-        # Get races sorted by the selected field
+        seasons = race_seasons()
+        season = selected_season(seasons, season)
+        if page is None:
+            page = request.args.get('page', 1, type=int)
+
+        # Get the season's races sorted by the selected field, through the
+        # (season, race_number) index, with their card summaries joined in
+        query = Race.query.filter_by(season=season).options(db.joinedload(Race.summary))
         if sort_by == 'race_number':
-            races = Race.query.order_by(Race.race_number).all()
+            query = query.order_by(Race.race_number)
         else:
-            races = Race.query.order_by(Race.name).all()
+            query = query.order_by(Race.name)
+        pagination = query.paginate(page=page, per_page=app.config['DASHBOARD_PER_PAGE'],
+                                    error_out=False)
+
+        return render_template('index.html', races=pagination.items, pagination=pagination,
+                               sort_by=sort_by, season=season, seasons=seasons)
 
-        return render_template('index.html', races=races, sort_by=sort_by)
 
 
 
+    def race_version(race_id):
+        fingerprint = race_fingerprint(race_id)
+        return (templates, fingerprint) if fingerprint else None
 
     @app.route('/race/<int:race_id>')
+    @cached_page(race_version)
     def race_details(race_id):
         """Display race details."""
         race = Race.query.get_or_404(race_id)
 
-        # Get the full path to the race folder
-        race_folder = os.path.join(
-            app.config['RACES_FOLDER'], race.folder_name)
-
-        # Load race data
-        results = load_race_results(race_folder)
-        fastest_laps = load_fastest_laps(race_folder)
-        pit_stops = load_pit_stops(race_folder)
-        grid_positions = load_grid_positions(race_folder)
+        # Load race data through the (race_id, position) indexes
+        results = race.results.all()
+        fastest_laps = race.fastest_laps.all()
+        pit_stops = race.pit_stops.all()
+        grid_positions = race.grid_positions.all()
 
         return render_template('race_details.html',
                                race=race,
                                results=results,
                                fastest_laps=fastest_laps,
                                pit_stops=pit_stops,
+                               pit_analysis=race_pit_stops(race_id),
                                grid_positions=grid_positions)
 
 
 
+    @app.route('/standings')
+    @app.route('/standings/<int:season>/')
+    def standings(season=None):
+        """Display the drivers' and constructors' championship standings."""
+        seasons = race_seasons()
+        season = selected_season(seasons, season)
+        return render_template('standings.html',
+                               drivers=driver_standings(season),
+                               constructors=constructor_standings(season),
+                               season=season, seasons=seasons)
+
+    @app.route('/standings/<kind>')
+    @app.route('/standings/<kind>/<int:season>/')
+    def standings_progression(kind, season=None):
+        """Display championship positions after each round."""
+        season = selected_season(race_seasons(), season)
+        if kind == 'drivers':
+            table = driver_standings(season)
+        elif kind == 'constructors':
+            table = constructor_standings(season)
+        else:
+            abort(404)
+
+        return render_template('standings_progression.html', kind=kind, standings=table,
+                               season=season)
+
+    @app.route('/pit-stops')
+    @app.route('/pit-stops/<int:season>/')
+    def pit_stops(season=None):
+        """Display stop time distributions, strategies and stop laps across a season."""
+        seasons = race_seasons()
+        season = selected_season(seasons, season)
+        return render_template('pit_stops.html', analysis=season_pit_stops(season),
+                               season=season, seasons=seasons)
+
+
+
+    @app.route('/compare')
+    def compare_page():
+        """Compare two drivers or two constructors across a season."""
+        seasons = race_seasons()
+        season = selected_season(seasons)
+        kind = request.args.get('kind', 'drivers')
+        if kind not in KINDS:
+            kind = 'drivers'
+
+        entities = comparison_index.entities(kind, season)
+        a = request.args.get('a')
+        b = request.args.get('b')
+        if a not in entities or b not in entities or a == b:
+            # Default to the top two of the championship
+            table = driver_standings(season) if kind == 'drivers' else constructor_standings(season)
+            leaders = [row['id'] for row in table.rows[:2]] or entities[:2]
+            if len(leaders) == 2:
+                a = a if a in entities else leaders[0]
+                b = b if b in entities and b != a else next(e for e in leaders if e != a)
+
+        comparison = compare(kind, a, b, season) if a and b and a != b else None
+        return render_template('compare.html', kind=kind, entities=entities, a=a, b=b,
+                               comparison=comparison, season=season, seasons=seasons)
+
+    @app.route('/what-if')
+    def what_if_page():
+        """Re-score a season under another points system, optionally with random retirements."""
+        seasons = race_seasons()
+        season = selected_season(seasons)
+        kind = request.args.get('kind', 'drivers')
+        if kind not in KINDS:
+            kind = 'drivers'
+        try:
+            rules = rules_from_args(request.args)
+        except ValueError as e:
+            flash(f'Invalid rules: {e}', 'danger')
+            rules = rules_from_args({})
+
+        table = driver_standings(season) if kind == 'drivers' else constructor_standings(season)
+        actual = {row['id']: row for row in table.rows}
+        standings = what_if(season, rules, kind)
+
+        trials = min(request.args.get('trials', 0, type=int), app.config['SIMULATION_MAX_TRIALS'])
+        dnf_rate = request.args.get('dnf_rate', 0.1, type=float)
+        dnf_rate = min(max(dnf_rate, 0.0), 1.0) if math.isfinite(dnf_rate) else 0.1
+        simulation = monte_carlo(season, rules, trials, dnf_rate, kind, seed=0) if trials > 0 else None
+
+        return render_template('what_if.html', kind=kind, rules=rules, args=request.args,
+                               systems=POINTS_SYSTEM_LABELS, default_system=DEFAULT_POINTS_SYSTEM,
+                               standings=standings, actual=actual,
+                               simulation=simulation, trials=trials, dnf_rate=dnf_rate,
+                               season=season, seasons=seasons)
+
+    @app.route('/search')
+    def search_page():
+        """Find drivers, constructors, races and circuits by name."""
+        query = request.args.get('q', '').strip()
+        kind = request.args.get('kind')
+        kinds = (kind,) if kind in SEARCH_KINDS else None
+        results = search(query, app.config['SEARCH_PAGE_RESULTS'], kinds) if query else []
+        return render_template('search.html', query=query, kind=kinds and kind, results=results,
+                               result_url=result_url)
+
+
+
     # Error handlers
     @app.errorhandler(404)
     def page_not_found(e):
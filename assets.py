@@ -0,0 +1,263 @@
+"""
+Flag image resolution, and the image build step.
+
+At startup the static/img folders are scanned once and every race is mapped
+to the flag image that actually exists, so pages link the right
+file directly instead of probing with onerror fallbacks. File name aliases
+('jap.jpg', 'us.jpg', ...) are data in FLAG_ALIASES rather than copies made
+by a fix-up script.
+
+`python assets.py build` (needs Pillow) writes resized WebP/AVIF flag
+thumbnails and one flag sprite sheet with its CSS to static/build/, under
+content-fingerprinted names that are served with a one-year cache lifetime.
+Its manifest, static/build/assets.json, is picked up on the next startup.
+"""
+import argparse
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+from flask import request, url_for
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+PLACEHOLDER = 'img/f1_placeholder.jpg'
+
+BUILD_DIR = 'build'
+BUILD_MANIFEST = os.path.join(BUILD_DIR, 'assets.json')
+
+# Race slug -> other file names its flag is stored under, best first
+FLAG_ALIASES = {
+    'australia': ['aus'],
+    'japan': ['jap'],
+    'saudi_arabia': ['saudi'],
+    'emilia_romagna': ['emilia'],
+    'great_britain': ['britian'],
+    'united_states': ['us', 'austin'],
+    'brazil': ['sao_paulo'],
+}
+
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_HEIGHT_RATIO = 140 / 360
+SPRITE_CELL = (48, 32)
+
+# Fingerprinted files can be cached for good
+LONG_CACHE_SECONDS = 365 * 24 * 3600
+
+RaceAssets = namedtuple('RaceAssets', ['flag', 'thumbnails', 'sprite_class'])
+
+
+def slugify(name):
+    """'Saudi Arabia' -> 'saudi_arabia', matching the image file names."""
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def _image_index(folder):
+    """Return {file stem: file name} for the images in a folder."""
+    index = {}
+    if not os.path.isdir(folder):
+        return index
+    for name in sorted(os.listdir(folder)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() in IMAGE_EXTENSIONS:
+            # Prefer .jpg over .png when both exist, like the old fallback order
+            index.setdefault(stem, name)
+    return index
+
+
+def _resolve(index, folder, slug, aliases):
+    for stem in [slug] + aliases.get(slug, []):
+        if stem in index:
+            return f'img/{folder}/{index[stem]}'
+    return None
+
+
+class AssetManifest:
+    """Maps race names to the static files that exist for them."""
+
+    def __init__(self):
+        self.static_folder = None
+        self.flags = {}
+        self.tracks = {}
+        self.build = {}
+
+    def load(self, static_folder):
+        """Scan the image folders and read the build manifest, if any."""
+        self.static_folder = static_folder
+        self.flags = _image_index(os.path.join(static_folder, 'img', 'flags'))
+        self.tracks = _image_index(os.path.join(static_folder, 'img', 'tracks'))
+        self.build = {}
+        build_manifest = os.path.join(static_folder, BUILD_MANIFEST)
+        if os.path.exists(build_manifest):
+            with open(build_manifest) as f:
+                self.build = json.load(f)
+        return self
+
+    def flag(self, name):
+        """Return the static path of a race's flag, falling back to its track, then a placeholder."""
+        slug = slugify(name)
+        return (_resolve(self.flags, 'flags', slug, FLAG_ALIASES) or
+                _resolve(self.tracks, 'tracks', slug, FLAG_ALIASES) or PLACEHOLDER)
+
+    def for_race(self, race):
+        flag = self.flag(race.name)
+        built = self.build.get('flags', {}).get(flag, {})
+        sprite_class = f'flag-sprite-{built["sprite"]}' if 'sprite' in built else None
+        return RaceAssets(flag, built.get('thumbnails', {}), sprite_class)
+
+
+asset_manifest = AssetManifest()
+
+
+def race_assets(race):
+    """Template helper: the RaceAssets of a Race row."""
+    return asset_manifest.for_race(race)
+
+
+def srcset(thumbnails, fmt):
+    """Template helper: a srcset attribute value for one thumbnail format."""
+    return ', '.join(f"{url_for('static', filename=path)} {width}w"
+                     for width, path in sorted(thumbnails.get(fmt, {}).items(), key=lambda item: int(item[0])))
+
+
+def sprite_stylesheet():
+    """Template helper: the static path of the flag sprite CSS, or None."""
+    return asset_manifest.build.get('sprite_css')
+
+
+def init_app(app):
+    """Build the asset manifest and register the template helpers."""
+    asset_manifest.load(app.static_folder)
+    app.add_template_global(race_assets)
+    app.add_template_global(srcset)
+    app.add_template_global(sprite_stylesheet)
+
+    @app.after_request
+    def cache_built_assets(response):
+        if (request.endpoint == 'static' and response.status_code == 200 and
+                request.view_args.get('filename', '').startswith(BUILD_DIR + '/')):
+            # send_static_file marks every file no-cache; built names change with their content
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = LONG_CACHE_SECONDS
+            response.cache_control.immutable = True
+        return response
+
+
+def _fingerprinted(data, stem, extension):
+    return f'{stem}.{hashlib.sha1(data).hexdigest()[:10]}{extension}'
+
+
+def _save(image, fmt, **options):
+    from io import BytesIO
+
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def _write(static_folder, relative, data):
+    path = os.path.join(static_folder, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return relative.replace(os.sep, '/')
+
+
+def _cover(image, size):
+    """Resize and center-crop an image to exactly size, like CSS object-fit: cover."""
+    width, height = size
+    scale = max(width / image.width, height / image.height)
+    resized = image.resize((max(width, round(image.width * scale)), max(height, round(image.height * scale))),
+                           Image.LANCZOS)
+    left = (resized.width - width) // 2
+    top = (resized.height - height) // 2
+    return resized.crop((left, top, left + width, top + height))
+
+
+def build_images(static_folder):
+    """
+    Write flag thumbnails, the flag sprite and its CSS into static/build/
+    and return the build manifest.
+    """
+    if Image is None:
+        raise RuntimeError('the image build needs Pillow (pip install pillow)')
+
+    manifest = AssetManifest().load(static_folder)
+    formats = [('webp', 'WEBP', {'quality': 80, 'method': 6})]
+    if features.check('avif'):
+        formats.append(('avif', 'AVIF', {'quality': 60}))
+
+    # A flag and a track image may share a stem: their names are prefixed
+    # with the kind, so each gets its own thumbnails and sprite class
+    sources = sorted([(f'img/flags/{name}', f'flag-{stem}') for stem, name in manifest.flags.items()] +
+                     [(f'img/tracks/{name}', f'track-{stem}') for stem, name in manifest.tracks.items()])
+    flags = {}
+    sprite = Image.new('RGB', (SPRITE_CELL[0] * len(sources), SPRITE_CELL[1]))
+    for i, (source, stem) in enumerate(sources):
+        with Image.open(os.path.join(static_folder, source)) as original:
+            original = original.convert('RGB')
+            thumbnails = {}
+            for width in THUMBNAIL_WIDTHS:
+                thumbnail = _cover(original, (width, round(width * THUMBNAIL_HEIGHT_RATIO)))
+                for extension, fmt, options in formats:
+                    data = _save(thumbnail, fmt, **options)
+                    name = _fingerprinted(data, f'{stem}-{width}', f'.{extension}')
+                    thumbnails.setdefault(extension, {})[str(width)] = _write(
+                        static_folder, os.path.join(BUILD_DIR, 'flags', name), data)
+            sprite.paste(_cover(original, SPRITE_CELL), (i * SPRITE_CELL[0], 0))
+        flags[source] = {'thumbnails': thumbnails, 'sprite': stem}
+
+    sprite_data = _save(sprite, 'WEBP', quality=85, method=6)
+    sprite_path = _write(static_folder, os.path.join(BUILD_DIR, _fingerprinted(sprite_data, 'flags', '.webp')),
+                         sprite_data)
+    rules = [f'.flag-sprite{{display:inline-block;width:{SPRITE_CELL[0]}px;height:{SPRITE_CELL[1]}px;'
+             f'background-image:url("{os.path.basename(sprite_path)}");background-repeat:no-repeat;'
+             f'vertical-align:middle}}']
+    for i, (source, _) in enumerate(sources):
+        rules.append(f'.flag-sprite-{flags[source]["sprite"]}{{background-position:-{i * SPRITE_CELL[0]}px 0}}')
+    css = '\n'.join(rules).encode('utf-8') + b'\n'
+    css_path = _write(static_folder, os.path.join(BUILD_DIR, _fingerprinted(css, 'flags', '.css')), css)
+
+    build = {'flags': flags, 'sprite': sprite_path, 'sprite_css': css_path}
+    manifest_path = os.path.join(static_folder, BUILD_MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(build, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return build
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve and build flag images.')
+    parser.add_argument('command', choices=['build', 'check'])
+    parser.add_argument('--static', default='static')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if Image is None:
+            parser.error('the image build needs Pillow (pip install pillow)')
+        build = build_images(args.static)
+        print(f"Wrote {len(build['flags'])} flags, sprite {build['sprite']} and {build['sprite_css']}")
+    else:
+        from app import create_app
+
+        app = create_app()
+        manifest = AssetManifest().load(app.static_folder)
+        with app.app_context():
+            from models import Race
+
+            for race in Race.query.order_by(Race.season, Race.race_number):
+                assets = manifest.for_race(race)
+                marker = '  ' if assets.flag != PLACEHOLDER else '! '
+                print(f'{marker}{race.season} {race.race_number:2d} {race.name:20s} {assets.flag}')
+
+
+if __name__ == '__main__':
+    main()
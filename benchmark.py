@@ -0,0 +1,186 @@
+"""
+Benchmark the data layer and routes against a synthetic races tree.
+
+Generates N seasons of M races with generate_races.py, then times ingest,
+each utils.py loader (cold YAML, warm cache and snapshot) and the dashboard
+and race_details routes through the Flask test client. Results are written
+as JSON so runs can be compared:
+
+    python benchmark.py --seasons 10 --races 24 --output bench-10.json
+    python benchmark.py --seasons 10 --races 24 --compare bench-10.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import snapshot
+from cache import page_cache, race_cache
+from config import Config
+from generate_races import generate_tree
+from models import Race
+from utils import (load_fastest_laps, load_grid_positions, load_pit_stops,
+                   load_race_results, load_races_data)
+
+LOADERS = {
+    'load_race_results': load_race_results,
+    'load_fastest_laps': load_fastest_laps,
+    'load_pit_stops': load_pit_stops,
+    'load_grid_positions': load_grid_positions,
+}
+
+
+def summarize(samples):
+    """Return timing statistics in milliseconds."""
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    return {
+        'runs': len(samples),
+        'min_ms': samples[0] * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p95_ms': p95 * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def timed(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def run_benchmarks(workdir, seasons, races, repeat):
+    races_folder = os.path.join(workdir, 'races')
+    start = time.perf_counter()
+    generate_tree(races_folder, seasons, races)
+    generated_in = time.perf_counter() - start
+
+    from app import create_app
+
+    config = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'RACES_FOLDER': races_folder,
+        'INGEST_ON_STARTUP': False,
+        'SNAPSHOT_PATH': os.path.join(workdir, 'races.snapshot'),
+        'PAGE_CACHE_DIR': None,
+    })
+    app = create_app(config)
+    results = {}
+
+    with app.app_context():
+        hashes = snapshot.folder_hashes(races_folder)
+        results['ingest.full'] = timed(
+            lambda: load_races_data(races_folder, hashes, force=True), repeat,
+            setup=race_cache.clear)
+        results['ingest.noop'] = timed(lambda: load_races_data(races_folder, hashes), repeat)
+        results['snapshot.build'] = timed(
+            lambda: snapshot.build_snapshot(races_folder, config.SNAPSHOT_PATH, hashes), repeat)
+
+        folders = [os.path.join(races_folder, race.folder_name) for race in Race.query.all()]
+        race_ids = [race.id for race in Race.query.order_by(Race.id).all()]
+
+        def load_all(loader):
+            return lambda: [loader(folder) for folder in folders]
+
+        snapshot.detach()
+        for name, loader in LOADERS.items():
+            results[f'{name}.cold'] = timed(load_all(loader), repeat, setup=race_cache.clear)
+            results[f'{name}.cached'] = timed(load_all(loader), repeat)
+        snapshot.ensure_snapshot(races_folder, config.SNAPSHOT_PATH, hashes)
+        for name, loader in LOADERS.items():
+            # The LRU cache is checked first: empty it so the mapping is what gets timed
+            results[f'{name}.snapshot'] = timed(load_all(loader), repeat, setup=race_cache.clear)
+
+    client = app.test_client()
+    middle = race_ids[len(race_ids) // 2]
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return request
+
+    for label, url in (('dashboard', '/dashboard'), ('race_details', f'/race/{middle}')):
+        results[f'route.{label}.uncached'] = timed(get(url), repeat, setup=page_cache.clear)
+        results[f'route.{label}.cached'] = timed(get(url), repeat)
+
+    for result in results.values():
+        result['per_race_ms'] = result['median_ms'] / max(1, len(folders))
+
+    return {
+        'meta': {
+            'seasons': seasons,
+            'races_per_season': races,
+            'race_folders': len(folders),
+            'repeat': repeat,
+            'generated_in_s': generated_in,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print median ratios against a baseline run; return the regressed names."""
+    regressions = []
+    for name, stats in sorted(current['results'].items()):
+        previous = baseline['results'].get(name)
+        if previous is None or not previous['median_ms']:
+            continue
+        ratio = stats['median_ms'] / previous['median_ms']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:36s} {previous["median_ms"]:10.3f} -> {stats["median_ms"]:10.3f} ms  '
+              f'x{ratio:5.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the F1 dashboard data layer.')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--races', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help='median ratio above which a result counts as a regression')
+    parser.add_argument('--workdir', help='keep the generated tree and database here')
+    args = parser.parse_args()
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        report = run_benchmarks(args.workdir, args.seasons, args.races, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory(prefix='f1-bench-') as workdir:
+            report = run_benchmarks(workdir, args.seasons, args.races, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        for name, stats in sorted(report['results'].items()):
+            print(f'{name:36s} median {stats["median_ms"]:10.3f} ms  p95 {stats["p95_ms"]:10.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
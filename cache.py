@@ -0,0 +1,289 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+
+def parse_yaml_file(path):
+    """Parse a YAML file with libyaml when it is available."""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+class RaceDataCache:
+    """
+    Process-wide LRU cache of parsed race YAML files.
+
+    Entries are keyed by (race folder, file name) and remember the mtime and
+    size of the file they were parsed from, so an edited file is re-parsed on
+    its next lookup. Cached objects are shared between callers and must be
+    treated as read-only.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, race_folder, filename, parse=None):
+        """
+        Return the parsed contents of a race file, or None if it is missing.
+
+        On a miss the file is read with parse(path) when given (e.g. from the
+        snapshot), else parsed as YAML.
+        """
+        path = os.path.join(race_folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (os.path.abspath(race_folder), filename)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        data = (parse or parse_yaml_file)(path)
+
+        with self._lock:
+            self._entries[key] = (stamp, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def resize(self, max_entries):
+        """Change the size bound, evicting least recently used entries."""
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counts and current occupancy."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'libyaml': YamlLoader.__name__ == 'CSafeLoader',
+            }
+
+
+race_cache = RaceDataCache()
+
+
+class ResponseCache:
+    """
+    LRU cache of response bodies bounded by their total size in bytes.
+
+    Keys must include a data fingerprint so a stale body is simply never
+    looked up again and ages out of the cache.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class PageCache:
+    """
+    Two-tier cache of rendered pages.
+
+    The memory tier is a byte-bounded ResponseCache. When a directory is
+    configured, pages are also written there so they survive worker restarts
+    and are shared by all workers on the host. Each page has one file, named
+    after its key and stamped with the data version it was rendered from:
+    a page rendered from newer data replaces the file, and a file from an
+    older version is deleted when it is read. The directory is swept back
+    under disk_bytes, least recently used files first, whenever the pages
+    this process wrote may have pushed it over.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, directory=None, disk_bytes=256 * 1024 * 1024):
+        self.memory = ResponseCache(max_bytes)
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self.disk_hits = 0
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def configure(self, max_bytes, directory=None, disk_bytes=256 * 1024 * 1024):
+        self.memory.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        if directory:
+            self.sweep()
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f'{digest}.html')
+
+    @staticmethod
+    def _stamp(version):
+        return hashlib.sha1(repr(version).encode('utf-8')).hexdigest().encode('ascii') + b'\n'
+
+    def get(self, key, version):
+        """Return (body, tier) where tier is 'memory' or 'disk', or (None, None)."""
+        body = self.memory.get((key, version))
+        if body is not None:
+            return body, 'memory'
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    stamp = f.readline()
+                    body = f.read()
+            except FileNotFoundError:
+                return None, None
+            if stamp != self._stamp(version):
+                # Rendered from data that has since changed
+                self._remove(path)
+                return None, None
+            # Reads keep a file at the young end of the sweep
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            self.memory.set((key, version), body)
+            self.disk_hits += 1
+            return body, 'disk'
+        return None, None
+
+    def set(self, key, version, body):
+        self.memory.set((key, version), body)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self._stamp(version))
+                f.write(body)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._written += len(body)
+                # Only walk the directory once this process may have filled it
+                due = self._written > self.disk_bytes // 10
+            if due:
+                self.sweep()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        """Delete the least recently used pages until the directory fits disk_bytes."""
+        with self._lock:
+            self._written = 0
+        if not (self.directory and os.path.isdir(self.directory)):
+            return
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.html'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.disk_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Drop the memory tier and every page stored on disk."""
+        self.memory.clear()
+        self.disk_hits = 0
+        if self.directory and os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith('.html'):
+                        self._remove(os.path.join(root, name))
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats['disk_hits'] = self.disk_hits
+        stats['directory'] = self.directory
+        stats['disk_bytes'] = self.disk_bytes
+        return stats
+
+
+page_cache = PageCache()
@@ -0,0 +1,239 @@
+"""
+Head-to-head comparison of two drivers or two constructors.
+
+An inverted index maps every driver and constructor to one summary entry per
+race it entered: finishing and grid position, points, qualifying time,
+fastest lap and pit stop times, taken from all four datasets. Entries are
+cached with the race folder's content hash, so after an ingest only the
+changed races are read again (one query per dataset for all of them), and a
+comparison only walks the two entities' posting lists for the season.
+"""
+import threading
+from statistics import median
+
+from sqlalchemy import select
+
+from models import FastestLap, GridPosition, PitStop, RaceResult, db
+from utils import VersionedCache, race_keys
+
+# URL kind -> entity column
+KINDS = {'drivers': 'driver_id', 'constructors': 'constructor_id'}
+
+
+def _new_entry():
+    return {
+        'position': None,
+        'position_text': None,
+        'grid_position': None,
+        'grid_position_text': None,
+        'points': 0,
+        'qualifying_ms': None,
+        'fastest_lap_ms': None,
+        'fastest_lap_rank': None,
+        'pit_stops': 0,
+        'pit_ms': [],
+    }
+
+
+def _better(current, value):
+    """Return the lower of two optional values (best position or time)."""
+    if value is None:
+        return current
+    if current is None:
+        return value
+    return min(current, value)
+
+
+def _race_entries(race_ids):
+    """
+    Build {race_id: {'driver_id': {id: entry}, 'constructor_id': {id: entry}}}
+    for a batch of races. Constructor entries combine both cars: best
+    position and time, summed points and pit stops.
+    """
+    entries = {race_id: {key: {} for key in KINDS.values()} for race_id in race_ids}
+
+    def entry(race_id, key, entity):
+        return entries[race_id][key].setdefault(entity, _new_entry())
+
+    results = db.session.execute(
+        select(RaceResult.race_id, RaceResult.driver_id, RaceResult.constructor_id,
+               RaceResult.position, RaceResult.position_text, RaceResult.grid_position,
+               RaceResult.grid_position_text, RaceResult.points)
+        .where(RaceResult.race_id.in_(race_ids))
+        .order_by(RaceResult.id))
+    for race_id, driver, constructor, position, position_text, grid, grid_text, points in results:
+        for key, entity in (('driver_id', driver), ('constructor_id', constructor)):
+            item = entry(race_id, key, entity)
+            # The *_text status ('DNF', 'PL') only matters while no car has a number
+            item['position'] = _better(item['position'], position)
+            item['position_text'] = item['position_text'] or position_text
+            item['grid_position'] = _better(item['grid_position'], grid)
+            item['grid_position_text'] = item['grid_position_text'] or grid_text
+            item['points'] += points or 0
+
+    grid_rows = db.session.execute(
+        select(GridPosition.race_id, GridPosition.driver_id, GridPosition.constructor_id,
+               GridPosition.time_ms)
+        .where(GridPosition.race_id.in_(race_ids)))
+    for race_id, driver, constructor, time_ms in grid_rows:
+        for key, entity in (('driver_id', driver), ('constructor_id', constructor)):
+            item = entry(race_id, key, entity)
+            item['qualifying_ms'] = _better(item['qualifying_ms'], time_ms)
+
+    laps = db.session.execute(
+        select(FastestLap.race_id, FastestLap.driver_id, FastestLap.constructor_id,
+               FastestLap.position, FastestLap.time_ms)
+        .where(FastestLap.race_id.in_(race_ids)))
+    for race_id, driver, constructor, rank, time_ms in laps:
+        for key, entity in (('driver_id', driver), ('constructor_id', constructor)):
+            item = entry(race_id, key, entity)
+            item['fastest_lap_ms'] = _better(item['fastest_lap_ms'], time_ms)
+            item['fastest_lap_rank'] = _better(item['fastest_lap_rank'], rank)
+
+    stops = db.session.execute(
+        select(PitStop.race_id, PitStop.driver_id, PitStop.constructor_id, PitStop.time_ms)
+        .where(PitStop.race_id.in_(race_ids))
+        .order_by(PitStop.id))
+    for race_id, driver, constructor, time_ms in stops:
+        for key, entity in (('driver_id', driver), ('constructor_id', constructor)):
+            item = entry(race_id, key, entity)
+            item['pit_stops'] += 1
+            if time_ms is not None:
+                item['pit_ms'].append(time_ms)
+
+    return entries
+
+
+def _summary(entries):
+    """Season totals for one entity's list of race entries."""
+    positions = [item['position'] for item in entries if item['position'] is not None]
+    pit_ms = [ms for item in entries for ms in item['pit_ms']]
+    return {
+        'races': len(entries),
+        'points': sum(item['points'] for item in entries),
+        'wins': sum(1 for position in positions if position == 1),
+        'podiums': sum(1 for position in positions if position <= 3),
+        'best_finish': min(positions) if positions else None,
+        'mean_finish': sum(positions) / len(positions) if positions else None,
+        'not_classified': len(entries) - len(positions),
+        'fastest_laps': sum(1 for item in entries if item['fastest_lap_rank'] == 1),
+        'pit_stops': sum(item['pit_stops'] for item in entries),
+        'median_pit_ms': median(pit_ms) if pit_ms else None,
+    }
+
+
+def _ahead(a, b):
+    """Return 0 if a is ahead, 1 if b is, None if neither can be ranked."""
+    if a is None and b is None:
+        return None
+    if b is None or (a is not None and a < b):
+        return 0
+    if a is None or b < a:
+        return 1
+    return None
+
+
+class ComparisonIndex:
+    """
+    Process-wide entity -> race entries index, refreshed one race at a time.
+
+    Posting lists are kept per season (and for all seasons together), so a
+    season comparison only checks that season's races for changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._indexes = VersionedCache(self._lock)
+
+    def _refresh(self, season, current):
+        live = {race.race_id for race, _ in current}
+        stale = [race for race, content_hash in current
+                 if content_hash is None or self._entries.get(race.race_id, (None,))[0] != content_hash]
+        hashes = {race.race_id: content_hash for race, content_hash in current}
+        if stale:
+            seasons = {race.race_id: race.season for race in stale}
+            for race_id, entries in _race_entries(list(seasons)).items():
+                self._entries[race_id] = (hashes[race_id], seasons[race_id], entries)
+        for race_id, (_, race_season, _) in list(self._entries.items()):
+            if race_id not in live and (season is None or race_season == season):
+                del self._entries[race_id]
+
+        # Posting lists: key -> entity -> [(RaceKey, entry)] in calendar order
+        postings = {key: {} for key in KINDS.values()}
+        for race, _ in current:
+            for key, by_entity in self._entries[race.race_id][2].items():
+                for entity, item in by_entity.items():
+                    postings[key].setdefault(entity, []).append((race, item))
+        return postings
+
+    def postings(self, key, season=None):
+        """Return {entity: [(RaceKey, entry)]} for 'driver_id' or 'constructor_id'."""
+        current = race_keys(season)
+        return self._indexes.get(season, current, lambda previous: self._refresh(season, current))[key]
+
+    def entities(self, kind, season=None):
+        """Return the sorted ids of a kind, optionally only those in one season."""
+        return sorted(self.postings(KINDS[kind], season))
+
+    def compare(self, kind, a, b, season=None):
+        """
+        Compare two entities race by race, optionally within one season.
+
+        Returns None if either entity is unknown; raises ValueError if a and b
+        are the same entity.
+        """
+        if a == b:
+            raise ValueError(f'cannot compare {a!r} with itself')
+        postings = self.postings(KINDS[kind], season)
+        if a not in postings or b not in postings:
+            return None
+        races_a = dict(postings[a])
+        races_b = dict(postings[b])
+
+        rounds = []
+        finishes = [0, 0]
+        qualifying = [0, 0]
+        qualifying_gaps = []
+        for race in sorted(races_a.keys() | races_b.keys(), key=lambda race: (race.season, race.race_number)):
+            item_a, item_b = races_a.get(race), races_b.get(race)
+            qualifying_gap = None
+            if item_a and item_b:
+                winner = _ahead(item_a['position'], item_b['position'])
+                if winner is not None:
+                    finishes[winner] += 1
+                if item_a['qualifying_ms'] is not None and item_b['qualifying_ms'] is not None:
+                    qualifying_gap = item_b['qualifying_ms'] - item_a['qualifying_ms']
+                    qualifying_gaps.append(qualifying_gap)
+                    winner = _ahead(item_a['qualifying_ms'], item_b['qualifying_ms'])
+                    if winner is not None:
+                        qualifying[winner] += 1
+            rounds.append({'race': race._asdict(), a: item_a, b: item_b,
+                           'qualifying_gap_ms': qualifying_gap})
+
+        return {
+            'kind': kind,
+            'season': season,
+            'entities': [a, b],
+            'summary': {a: _summary(list(races_a.values())), b: _summary(list(races_b.values()))},
+            'head_to_head': {
+                'finishes': finishes,
+                'qualifying': qualifying,
+                'mean_qualifying_gap_ms': (sum(qualifying_gaps) / len(qualifying_gaps)
+                                           if qualifying_gaps else None),
+            },
+            'rounds': rounds,
+        }
+
+    def clear(self):
+        self._indexes.clear()
+        with self._lock:
+            self._entries = {}
+
+
+comparison_index = ComparisonIndex()
+
+
+def compare(kind, a, b, season=None):
+    """Compare two drivers or two constructors; see ComparisonIndex.compare."""
+    return comparison_index.compare(kind, a, b, season)
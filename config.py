@@ -14,4 +14,60 @@ class Config:
     SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
     
     # Race data path
-    RACES_FOLDER = os.environ.get('RACES_FOLDER', 'races') 
\ No newline at end of file
+    RACES_FOLDER = os.environ.get('RACES_FOLDER', 'races')
+
+    # Season of race folders kept directly under RACES_FOLDER (races/<n> <name>);
+    # other seasons live in races/<year>/<n> <name>
+    DEFAULT_SEASON = int(os.environ.get('DEFAULT_SEASON', 2024))
+
+    # Races per dashboard page
+    DASHBOARD_PER_PAGE = int(os.environ.get('DASHBOARD_PER_PAGE', 24))
+
+    # Sync RACES_FOLDER into the database when the app starts
+    INGEST_ON_STARTUP = os.environ.get('INGEST_ON_STARTUP', '1') == '1'
+
+    # Maximum number of parsed race files kept in memory
+    RACE_CACHE_SIZE = int(os.environ.get('RACE_CACHE_SIZE', 256))
+
+    # Columnar snapshot of the races folder (defaults to the instance folder)
+    SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH')
+    USE_SNAPSHOT = os.environ.get('USE_SNAPSHOT', '1') == '1'
+
+    # Upper bound on serialized/compressed API bodies kept in memory
+    API_CACHE_BYTES = int(os.environ.get('API_CACHE_BYTES', 32 * 1024 * 1024))
+
+    # Rendered page cache; set PAGE_CACHE_DIR to keep pages across restarts
+    PAGE_CACHE_BYTES = int(os.environ.get('PAGE_CACHE_BYTES', 16 * 1024 * 1024))
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR')
+    PAGE_CACHE_DIR_BYTES = int(os.environ.get('PAGE_CACHE_DIR_BYTES', 256 * 1024 * 1024))
+
+    # Poll RACES_FOLDER and hot-reload changed race folders
+    WATCH_RACES = os.environ.get('WATCH_RACES', '0') == '1'
+    WATCH_INTERVAL = float(os.environ.get('WATCH_INTERVAL', 5))
+
+    # Request, loader, SQL and render metrics served at /metrics. Set
+    # METRICS_DIR when running several worker processes so a scrape of any
+    # of them reports the totals of all workers.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+    # Search: results on the /search page, and the most a typeahead
+    # request to /api/search may ask for
+    SEARCH_PAGE_RESULTS = int(os.environ.get('SEARCH_PAGE_RESULTS', 50))
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 20))
+    # Seconds between checks for syncs the search index has not seen
+    SEARCH_CHECK_INTERVAL = float(os.environ.get('SEARCH_CHECK_INTERVAL', 5))
+
+    # What-if simulator: the most Monte Carlo trials one request may run
+    SIMULATION_MAX_TRIALS = int(os.environ.get('SIMULATION_MAX_TRIALS', 50000))
+
+    # Remote copy of the race data (python remote_sync.py push): a SQLAlchemy
+    # URL such as Supabase's Postgres connection string, or the Supabase REST
+    # API at SUPABASE_URL when unset. Rows are pushed about SYNC_BATCH_ROWS at
+    # a time over SYNC_WORKERS connections, and progress is checkpointed in
+    # SYNC_CHECKPOINT (defaults to the instance folder).
+    SYNC_DATABASE_URI = os.environ.get('SYNC_DATABASE_URI')
+    SYNC_BATCH_ROWS = int(os.environ.get('SYNC_BATCH_ROWS', 5000))
+    SYNC_WORKERS = int(os.environ.get('SYNC_WORKERS', 4))
+    SYNC_CHECKPOINT = os.environ.get('SYNC_CHECKPOINT')
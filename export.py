@@ -0,0 +1,213 @@
+"""
+Streaming CSV and Parquet export of the per-race datasets.
+
+Rows come from the database through a server-side cursor (yield_per), pass
+through generators and leave as encoded chunks, so memory stays flat however
+many seasons are exported. Parquet output needs pyarrow; each batch of rows
+is written as one row group and sent as soon as it is encoded.
+
+Usage:
+
+    python export.py results --season 2024 --format csv --output results-2024.csv
+    python export.py all --format parquet --output exports/
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+
+from sqlalchemy import select
+
+from config import Config
+from models import FastestLap, GridPosition, PitStop, Race, RaceResult, db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Dataset name -> model, as used in URLs and file names
+EXPORT_MODELS = {
+    'results': RaceResult,
+    'fastest-laps': FastestLap,
+    'pit-stops': PitStop,
+    'grid': GridPosition,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+RACE_COLUMNS = ('season', 'race_number', 'race_name')
+
+BATCH_ROWS = 5000
+CHUNK_BYTES = 64 * 1024
+
+
+class ExportConfig(Config):
+    # A one-off command: sync on startup as usual, but don't start the watcher
+    WATCH_RACES = False
+
+
+def export_columns(model):
+    """Return the column names of an exported dataset."""
+    return RACE_COLUMNS + model.insert_columns()
+
+
+def iter_rows(model, season=None):
+    """Yield one tuple per dataset row in calendar and file order."""
+    columns = [getattr(model, name) for name in model.insert_columns()]
+    query = (select(Race.season, Race.race_number, Race.name, *columns)
+             .join(Race, Race.id == model.race_id)
+             .order_by(Race.season, Race.race_number, model.id))
+    if season is not None:
+        query = query.where(Race.season == season)
+    for row in db.session.execute(query.execution_options(yield_per=BATCH_ROWS)):
+        yield tuple(row)
+
+
+def iter_csv(model, season=None):
+    """Yield a dataset as UTF-8 CSV in chunks of about CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_columns(model))
+    for row in iter_rows(model, season):
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(model):
+    fields = [pa.field('season', pa.int32()), pa.field('race_number', pa.int32()),
+              pa.field('race_name', pa.string())]
+    for name in model.insert_columns():
+        column_type = model.__table__.columns[name].type
+        if isinstance(column_type, db.Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, db.Integer):
+            arrow_type = pa.int32()
+        elif isinstance(column_type, db.Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def iter_parquet(model, season=None):
+    """Yield a dataset as Parquet, one row group of BATCH_ROWS rows at a time."""
+    if pa is None:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow)')
+    schema = _arrow_schema(model)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+
+    def write_batch(batch):
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema))
+
+    batch = []
+    for row in iter_rows(model, season):
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            write_batch(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write_batch(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(model, fmt, season=None):
+    """Yield an encoded export of a dataset in 'csv' or 'parquet' format."""
+    if fmt == 'parquet':
+        return iter_parquet(model, season)
+    return iter_csv(model, season)
+
+
+def export_filename(dataset, fmt, season=None):
+    suffix = f'-{season}' if season is not None else ''
+    return f'{dataset}{suffix}.{fmt}'
+
+
+def write_export(dataset, fmt, output, season=None):
+    """Write one dataset to a file path, or to stdout when output is '-'; returns bytes written."""
+    written = 0
+    target = sys.stdout.buffer if output == '-' else open(output, 'wb')
+    try:
+        for chunk in iter_export(EXPORT_MODELS[dataset], fmt, season):
+            target.write(chunk)
+            written += len(chunk)
+    finally:
+        if target is not sys.stdout.buffer:
+            target.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export race datasets as CSV or Parquet.')
+    parser.add_argument('dataset', choices=list(EXPORT_MODELS) + ['all'])
+    parser.add_argument('--season', type=int, help='export one season (default: all seasons)')
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('--output', default='-',
+                        help="output file, '-' for stdout, or a directory when exporting all datasets")
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and pa is None:
+        parser.error('Parquet export needs pyarrow (pip install pyarrow)')
+    if args.dataset == 'all' and args.output == '-':
+        parser.error('exporting all datasets needs --output DIRECTORY')
+
+    from app import create_app
+
+    app = create_app(ExportConfig)
+    with app.app_context():
+        if args.dataset == 'all':
+            os.makedirs(args.output, exist_ok=True)
+            for dataset in EXPORT_MODELS:
+                path = os.path.join(args.output, export_filename(dataset, args.format, args.season))
+                written = write_export(dataset, args.format, path, args.season)
+                print(f'Wrote {path} ({written} bytes)')
+        else:
+            written = write_export(args.dataset, args.format, args.output, args.season)
+            if args.output != '-':
+                print(f'Wrote {args.output} ({written} bytes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+Freeze the site to static HTML.
+
+Renders the home page, every dashboard page (each season, sort order and
+page), every race page and the standings and pit stop pages to
+OUTPUT/<url>/index.html with pre-compressed .gz (and, with brotli
+installed, .br) siblings, and copies static/ alongside. The output can be
+served by any static file server; only /api, /compare, /what-if, /search
+and /metrics still need Flask.
+
+Pages are rendered in parallel across a process pool. Each page's data
+fingerprint is recorded in OUTPUT/.freeze-manifest.json, and later builds
+only re-render pages whose fingerprint changed (or --full for all of them).
+
+Usage:
+
+    python freeze.py [--output site] [--workers N] [--full]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import url_for
+
+from config import Config
+from models import Race
+from utils import data_version, race_fingerprints, race_seasons
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = '.freeze-manifest.json'
+
+# Rendered as OUTPUT/404.html for the static server's error page
+NOT_FOUND_PAGE = '/404.html'
+
+SORTS = ('race_number', 'name')
+
+COMPRESSIBLE = ('.html', '.css', '.js', '.svg', '.json', '.txt')
+
+
+class FreezeConfig(Config):
+    # Render what the database holds; don't watch the races folder or
+    # keep a disk page cache next to the output
+    WATCH_RACES = False
+    PAGE_CACHE_DIR = None
+    METRICS_ENABLED = False
+
+
+def _version(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def site_pages(app):
+    """Return {url: data fingerprint} for every page of the static site."""
+    from app import templates_version
+
+    pages = {}
+    with app.test_request_context():
+        templates = templates_version(app)
+        seasons = race_seasons()
+        per_page = app.config['DASHBOARD_PER_PAGE']
+
+        pages[url_for('home')] = _version(templates)
+        pages[NOT_FOUND_PAGE] = _version(templates)
+
+        for season in seasons:
+            version = _version(templates, tuple(seasons), data_version(season))
+            races = Race.query.filter_by(season=season).count()
+            for sort in SORTS:
+                for page in range(1, max(1, math.ceil(races / per_page)) + 1):
+                    pages[url_for('dashboard', season=season, sort=sort, page=page)] = version
+            pages[url_for('standings', season=season)] = version
+            pages[url_for('pit_stops', season=season)] = version
+            for kind in ('drivers', 'constructors'):
+                pages[url_for('standings_progression', kind=kind, season=season)] = version
+            if season == seasons[0]:
+                # The unqualified URLs show the newest season
+                pages[url_for('dashboard')] = version
+                pages[url_for('standings')] = version
+                pages[url_for('pit_stops')] = version
+                for kind in ('drivers', 'constructors'):
+                    pages[url_for('standings_progression', kind=kind)] = version
+
+        for race_id, fingerprint in race_fingerprints().items():
+            pages[url_for('race_details', race_id=race_id)] = _version(templates, fingerprint)
+    return pages
+
+
+def page_path(output, url):
+    """Map a URL to its file: '/' -> index.html, '/race/5' -> race/5/index.html."""
+    if url == NOT_FOUND_PAGE:
+        return os.path.join(output, '404.html')
+    parts = [part for part in url.split('/') if part]
+    return os.path.join(output, *parts, 'index.html')
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_compressed(path, data):
+    """Write a file with its .gz and .br siblings."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, data)
+    _write_atomic(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(path + '.br', brotli.compress(data, quality=11))
+
+
+def remove_page(output, url):
+    path = page_path(output, url)
+    for name in (path, path + '.gz', path + '.br'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+_worker_app = None
+
+
+def _init_worker(overrides):
+    global _worker_app
+    from app import create_app
+
+    config = type('FreezeWorkerConfig', (FreezeConfig,), overrides)
+    _worker_app = create_app(config)
+
+
+def render_page(output, url):
+    """Worker entry point: render one URL to disk; returns (url, status code)."""
+    client = _worker_app.test_client()
+    if url == NOT_FOUND_PAGE:
+        response = client.get('/__freeze-not-found__')
+        expected = 404
+    else:
+        response = client.get(url)
+        expected = 200
+    if response.status_code == expected:
+        write_compressed(page_path(output, url), response.get_data())
+    return url, response.status_code
+
+
+def sync_static(source, destination):
+    """Copy new or changed static files, compressing text assets; returns the number copied."""
+    copied = 0
+    for root, _, files in os.walk(source):
+        target_root = os.path.join(destination, os.path.relpath(root, source))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source_path = os.path.join(root, name)
+            target_path = os.path.join(target_root, name)
+            stat = os.stat(source_path)
+            if os.path.exists(target_path):
+                target = os.stat(target_path)
+                if target.st_size == stat.st_size and target.st_mtime_ns == stat.st_mtime_ns:
+                    continue
+            if name.endswith(COMPRESSIBLE):
+                with open(source_path, 'rb') as f:
+                    write_compressed(target_path, f.read())
+                os.utime(target_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            else:
+                shutil.copy2(source_path, target_path)
+            copied += 1
+    return copied
+
+
+def freeze(app, output, workers=None, full=False):
+    """
+    Render changed pages of app into output; returns (rendered, removed, failed).
+
+    Must be called outside an app context; the worker processes build their
+    own app from the same configuration.
+    """
+    os.makedirs(output, exist_ok=True)
+    manifest_path = os.path.join(output, MANIFEST)
+    manifest = {}
+    if not full and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    with app.app_context():
+        pages = site_pages(app)
+
+    stale = sorted(url for url, version in pages.items()
+                   if manifest.get(url) != version or not os.path.exists(page_path(output, url)))
+    removed = sorted(url for url in manifest if url not in pages)
+    for url in removed:
+        remove_page(output, url)
+
+    # Workers read the database the parent has just synced
+    overrides = {name: app.config[name] for name in dir(Config) if name.isupper()}
+    overrides.update(WATCH_RACES=False, PAGE_CACHE_DIR=None, METRICS_ENABLED=False,
+                     INGEST_ON_STARTUP=False)
+    rendered = []
+    failed = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(overrides,)) as pool:
+            for url, status in pool.map(render_page, [output] * len(stale), stale,
+                                        chunksize=max(1, len(stale) // (4 * (workers or os.cpu_count() or 1)))):
+                # Only the error page itself is meant to be a 404
+                if status == (404 if url == NOT_FOUND_PAGE else 200):
+                    rendered.append(url)
+                else:
+                    failed.append((url, status))
+
+    sync_static(app.static_folder, os.path.join(output, 'static'))
+
+    failed_urls = {url for url, _ in failed}
+    new_manifest = {url: version for url, version in pages.items() if url not in failed_urls}
+    _write_atomic(manifest_path, json.dumps(new_manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return rendered, removed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the site to static, pre-compressed HTML.')
+    parser.add_argument('--output', default='site')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--full', action='store_true', help='re-render every page')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    start = time.perf_counter()
+    app = create_app(FreezeConfig)
+    rendered, removed, failed = freeze(app, args.output, args.workers, args.full)
+    print(f'Rendered {len(rendered)} pages, removed {len(removed)} in '
+          f'{time.perf_counter() - start:.1f}s with {args.workers or os.cpu_count()} workers '
+          f'into {args.output}')
+    for url, status in failed:
+        print(f'  {url}: HTTP {status}')
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
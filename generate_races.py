@@ -0,0 +1,222 @@
+"""
+Generate a synthetic races/ tree for benchmarking.
+
+Writes N seasons of M races each, using exactly the YAML shapes of the real
+data (race-results, fastest-laps, pit-stops and starting-grid-positions),
+including DNF/DNS/DSQ finishes, pit-lane starts and grid penalties.
+
+Usage:
+
+    python generate_races.py OUTPUT --seasons 10 --races 24 [--seed 1]
+"""
+import argparse
+import os
+import random
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+CIRCUITS = [
+    'bahrain', 'Saudi Arabia', 'Australia', 'Japan', 'china', 'miami', 'Emilia Romagna',
+    'monaco', 'canada', 'spain', 'austria', 'Great Britain', 'hungary', 'belgium',
+    'netherlands', 'italy', 'azerbaijan', 'singapore', 'United States', 'mexico',
+    'Brazil', 'las vegas', 'qatar', 'abu dhabi',
+]
+
+CONSTRUCTORS = [
+    ('red-bull', 'honda-rbpt'), ('ferrari', 'ferrari'), ('mercedes', 'mercedes'),
+    ('mclaren', 'mercedes'), ('aston-martin', 'mercedes'), ('alpine', 'renault'),
+    ('williams', 'mercedes'), ('rb', 'honda-rbpt'), ('kick-sauber', 'ferrari'),
+    ('haas', 'ferrari'),
+]
+
+POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+RETIREMENTS = ['Engine', 'Collision', 'Gearbox', 'Brakes', 'Hydraulics', 'Accident', 'Withdrew']
+
+
+def format_lap(ms):
+    """Format milliseconds as '1:32.608' (or '36.604' under a minute)."""
+    minutes, rest = divmod(ms, 60000)
+    seconds, millis = divmod(rest, 1000)
+    if minutes:
+        return f'{minutes}:{seconds:02d}.{millis:03d}'
+    return f'{seconds}.{millis:03d}'
+
+
+def format_race(ms):
+    """Format milliseconds as '1:31:44.742'."""
+    hours, rest = divmod(ms, 3600000)
+    return f'{hours}:{format_lap(rest).zfill(9)}'
+
+
+def format_gap(ms):
+    """Format a gap in milliseconds as '+22.457' or '+1:02.345'."""
+    return '+' + format_lap(ms)
+
+
+def season_entrants(rng, season):
+    """Return 20 (driverNumber, driverId, constructorId, engine) entries."""
+    entrants = []
+    number_pool = rng.sample(range(2, 99), 20)
+    for i in range(20):
+        constructor, engine = CONSTRUCTORS[i // 2]
+        entrants.append({
+            'driverNumber': number_pool[i],
+            'driverId': f'driver-{season}-{i + 1:02d}',
+            'constructorId': constructor,
+            'engineManufacturerId': engine,
+        })
+    return entrants
+
+
+def _entry(entrant, position):
+    return {
+        'position': position,
+        'driverNumber': entrant['driverNumber'],
+        'driverId': entrant['driverId'],
+        'constructorId': entrant['constructorId'],
+        'engineManufacturerId': entrant['engineManufacturerId'],
+        'tyreManufacturerId': 'pirelli',
+    }
+
+
+def generate_race(rng, entrants, laps=57):
+    """Return the four datasets of one synthetic race."""
+    base_lap = rng.randint(68000, 105000)
+
+    # Starting grid, with the odd pit-lane start or penalty
+    grid_order = rng.sample(entrants, len(entrants))
+    grid = []
+    grid_positions = {}
+    for i, entrant in enumerate(grid_order, start=1):
+        pit_lane = rng.random() < 0.02
+        position = 'PL' if pit_lane else i
+        grid_positions[entrant['driverId']] = position
+        row = _entry(entrant, position)
+        row['gridPenalty'] = rng.choice([None] * 30 + [3, 5, 10, 'SFB'])
+        row['time'] = None if pit_lane or i > 18 else format_lap(base_lap - 3000 + i * 90 + rng.randint(0, 80))
+        grid.append(row)
+
+    # Race result: mostly grid order with noise, a few retirements
+    finish_order = sorted(entrants, key=lambda e: (grid_order.index(e) + rng.gauss(0, 3)))
+    winner_time = base_lap * laps + rng.randint(0, 60000)
+    results = []
+    gap_ms = 0
+    classified = 0
+    fastest_driver = rng.choice(finish_order[:10])['driverId']
+    for entrant in finish_order:
+        row = _entry(entrant, None)
+        roll = rng.random()
+        retired = roll < 0.08
+        status = None
+        if retired:
+            status = 'DNF' if roll < 0.075 else rng.choice(['DNS', 'DSQ'])
+        if retired:
+            row['position'] = status
+            row['laps'] = rng.randint(0, laps - 1) if status != 'DNS' else None
+            row['time'] = None
+            row['timePenalty'] = None
+            row['gap'] = None
+            row['interval'] = None
+            row['reasonRetired'] = rng.choice(RETIREMENTS)
+            row['points'] = None
+        else:
+            classified += 1
+            row['position'] = classified
+            step = rng.randint(300, 15000) if classified > 1 else 0
+            gap_ms += step
+            row['laps'] = laps
+            row['time'] = format_race(winner_time) if classified == 1 else None
+            row['timePenalty'] = rng.choice([None] * 20 + ['5.000', '10.000'])
+            row['gap'] = format_gap(gap_ms) if classified > 1 else None
+            row['interval'] = format_gap(step) if classified > 1 else None
+            row['reasonRetired'] = None
+            points = POINTS[classified - 1] if classified <= 10 else None
+            if points and entrant['driverId'] == fastest_driver:
+                points += 1
+            row['points'] = points
+        row['gridPosition'] = grid_positions[entrant['driverId']]
+        results.append(row)
+    # Classified finishers come first, then retirements
+    results.sort(key=lambda row: isinstance(row['position'], str))
+
+    # Fastest laps, one per driver who completed a lap
+    laps_rows = []
+    lap_times = sorted(
+        ((base_lap + rng.randint(0, 4000), entrant) for entrant in entrants if rng.random() > 0.03),
+        key=lambda lap: lap[0])
+    best = lap_times[0][0]
+    previous = best
+    for i, (lap_ms, entrant) in enumerate(lap_times, start=1):
+        row = _entry(entrant, i)
+        row['lap'] = rng.randint(2, laps)
+        row['time'] = format_lap(lap_ms)
+        row['gap'] = format_gap(lap_ms - best) if i > 1 else None
+        row['interval'] = format_gap(lap_ms - previous) if i > 1 else None
+        previous = lap_ms
+        laps_rows.append(row)
+
+    # Pit stops in lap order
+    stops = []
+    for entrant in entrants:
+        for stop in range(1, rng.choice([1, 1, 2, 2, 2, 3]) + 1):
+            stops.append((rng.randint(stop * 12, stop * 12 + 12), stop, entrant))
+    stops.sort(key=lambda s: (s[0], s[1]))
+    pit_rows = []
+    for i, (lap, stop, entrant) in enumerate(stops, start=1):
+        row = _entry(entrant, i)
+        row['stop'] = stop
+        row['lap'] = lap
+        row['time'] = format_lap(rng.randint(21000, 30000))
+        pit_rows.append(row)
+
+    return {
+        'race-results.yml': results,
+        'fastest-laps.yml': laps_rows,
+        'pit-stops.yml': pit_rows,
+        'starting-grid-positions.yml': grid,
+    }
+
+
+def generate_tree(output, seasons, races, seed=1, first_season=2024):
+    """
+    Write a synthetic races tree and return the race folder paths.
+
+    Each season gets its own '<year>/<n> <name>' folders, numbered from 1.
+    """
+    rng = random.Random(seed)
+    folders = []
+    for season_index in range(seasons):
+        season = first_season - season_index
+        entrants = season_entrants(rng, season)
+        for race_index in range(races):
+            circuit = CIRCUITS[race_index % len(CIRCUITS)]
+            folder = os.path.join(output, str(season), f'{race_index + 1} {circuit}')
+            os.makedirs(folder, exist_ok=True)
+            for filename, rows in generate_race(rng, entrants).items():
+                with open(os.path.join(folder, filename), 'w') as f:
+                    yaml.dump(rows, f, Dumper=YamlDumper, sort_keys=False,
+                              default_flow_style=False, allow_unicode=True)
+            folders.append(folder)
+    return folders
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic races/ tree.')
+    parser.add_argument('output')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--races', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    folders = generate_tree(args.output, args.seasons, args.races, args.seed)
+    print(f'Wrote {len(folders)} race folders to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
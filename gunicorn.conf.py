@@ -0,0 +1,35 @@
+"""
+gunicorn settings; gunicorn reads this file from the working directory:
+
+    gunicorn
+
+The app is loaded once in the master before the workers are forked, so
+the race data is ingested, mapped and indexed once and shared by every
+worker (see preload.py). Set PRELOAD_APP=0 to load the app in each worker
+instead, e.g. with --reload during development.
+"""
+import os
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+
+
+def when_ready(server):
+    # Runs in the master once the preloaded app exists, before any fork
+    if server.cfg.preload_app:
+        import preload
+
+        app = server.app.wsgi()
+        seasons = preload.warm(app)
+        preload.before_fork(app)
+        server.log.info('Preloaded race data for %d seasons', seasons)
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        import preload
+
+        preload.after_fork(server.app.wsgi())
@@ -0,0 +1,118 @@
+"""
+Parallel bulk ingest of race folders.
+
+Race folders are parsed across a ProcessPoolExecutor. Each worker runs the
+utils.py loaders (libyaml-backed) and returns compact row tuples, and the
+parent writes everything through the manifest sync in one transaction.
+
+Usage:
+
+    python ingest.py [--races races] [--workers N] [--full] [--verbose]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+
+from config import Config
+from models import RaceManifest
+from snapshot import folder_hashes
+from utils import RACE_DATA_LOADERS, load_races_data, parse_race_path
+
+
+class IngestConfig(Config):
+    # The command does its own ingest, so skip the one in create_app
+    INGEST_ON_STARTUP = False
+
+
+def parse_folder(races_folder, folder):
+    """
+    Worker entry point: parse one race folder.
+
+    Returns (folder, {table name: [row tuples]}, {file name: seconds}).
+    """
+    race_folder = os.path.join(races_folder, folder)
+    records = {}
+    timings = {}
+    for model, loader in RACE_DATA_LOADERS:
+        start = time.perf_counter()
+        data = loader(race_folder) or []
+        records[model.__tablename__] = [model.record_values(record) for record in data]
+        timings[f'{folder}/{model.__tablename__}'] = time.perf_counter() - start
+    return folder, records, timings
+
+
+def parse_folders(races_folder, folders, workers=None):
+    """Parse race folders in a process pool; returns (parsed, timings)."""
+    parsed = {}
+    timings = {}
+    if not folders:
+        return parsed, timings
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for folder, records, folder_timings in pool.map(
+                parse_folder, [races_folder] * len(folders), folders,
+                chunksize=max(1, len(folders) // (4 * (workers or os.cpu_count() or 1)))):
+            parsed[folder] = records
+            timings.update(folder_timings)
+    return parsed, timings
+
+
+def bulk_ingest(races_folder, workers=None, full=False):
+    """
+    Parse changed (or, with full=True, all) race folders in parallel and
+    sync them into the database. Must run inside an app context.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    default_season = current_app.config['DEFAULT_SEASON']
+    hashes = {folder: content_hash for folder, content_hash in folder_hashes(races_folder).items()
+              if parse_race_path(folder, default_season)}
+    timings['hash'] = time.perf_counter() - start
+
+    manifest = {entry.folder_name: entry.content_hash for entry in RaceManifest.query.all()}
+    folders = sorted(folder for folder, content_hash in hashes.items()
+                     if full or manifest.get(folder) != content_hash)
+
+    start = time.perf_counter()
+    parsed, file_timings = parse_folders(races_folder, folders, workers)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = load_races_data(races_folder, hashes, parsed=parsed, force=full)
+    timings['write'] = time.perf_counter() - start
+
+    timings['total'] = timings['hash'] + timings['parse'] + timings['write']
+    return result, folders, timings, file_timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk ingest race folders in parallel.')
+    parser.add_argument('--races', default=IngestConfig.RACES_FOLDER)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--full', action='store_true',
+                        help='re-ingest every folder, not only changed ones')
+    parser.add_argument('--verbose', action='store_true', help='print per-file parse timings')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    IngestConfig.RACES_FOLDER = args.races
+    app = create_app(IngestConfig)
+    with app.app_context():
+        result, folders, timings, file_timings = bulk_ingest(args.races, args.workers, args.full)
+
+    if args.verbose:
+        for name, seconds in sorted(file_timings.items()):
+            print(f'{seconds * 1000:9.2f} ms  {name}')
+    print(f'Parsed {len(folders)} folders with {args.workers or os.cpu_count()} workers: '
+          f'{len(result.inserted)} inserted, {len(result.updated)} updated, '
+          f'{len(result.deleted)} deleted')
+    print('  ' + '  '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in timings.items()))
+
+
+if __name__ == '__main__':
+    main()
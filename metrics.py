@@ -0,0 +1,303 @@
+"""
+Request and data-layer metrics exposed at /metrics in the Prometheus text
+format.
+
+Every process keeps its counters and histograms in memory; recording a value
+is a dict lookup and a bisect under one lock. With METRICS_DIR set (needed
+when gunicorn runs several workers) each process also writes its values to
+METRICS_DIR/metrics-<pid>.json, at most once per METRICS_FLUSH_INTERVAL, and
+a scrape of any worker adds up the files of all of them. Clear METRICS_DIR
+before starting the server so totals from an earlier run are not added in.
+
+Recorded series:
+
+    f1_http_request_duration_seconds   per endpoint, method and status
+    f1_loader_duration_seconds         per race file and source (cache, snapshot or yaml)
+    f1_db_queries_total                SQL statements per endpoint
+    f1_db_query_duration_seconds       SQL statement time per endpoint
+    f1_db_queries_per_request          statements issued by one request
+    f1_template_render_seconds         per template
+"""
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labels, amount=1):
+        self.registry._update(self, labels, lambda value: (value or 0) + amount)
+
+    def merge(self, value, other):
+        return (value or 0) + other
+
+    def render(self, series):
+        for labels, value in sorted(series.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, *labels):
+        index = bisect.bisect_left(self.buckets, amount)
+
+        def update(value):
+            # [count per bucket..., count above the last bucket, sum]
+            if value is None:
+                value = [0] * (len(self.buckets) + 1) + [0.0]
+            value[index] += 1
+            value[-1] += amount
+            return value
+        self.registry._update(self, labels, update)
+
+    def merge(self, value, other):
+        if value is None:
+            return list(other)
+        return [a + b for a, b in zip(value, other)]
+
+    def render(self, series):
+        for labels, value in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                le = (('le', _format_value(bound)),)
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {_format_value(value[-1])}'
+            yield f'{self.name}_count{label_text} {cumulative}'
+
+
+class MetricsRegistry:
+    """Process-local metric values, optionally shared through per-process files."""
+
+    def __init__(self):
+        self.enabled = True
+        self.directory = None
+        self.flush_interval = 1.0
+        self._metrics = {}
+        self._values = {}
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=True, directory=None, flush_interval=1.0):
+        self.enabled = enabled
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # Write out values recorded since the last throttled flush
+            atexit.unregister(self.flush)
+            atexit.register(self.flush, force=True)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _update(self, metric, labels, update):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: start from zero rather than re-count the parent's values
+                self._pid = os.getpid()
+                self._values = {}
+                self._last_flush = 0.0
+            series = self._values.setdefault(metric.name, {})
+            series[labels] = update(series.get(labels))
+
+    def _snapshot(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            return {name: {labels: list(value) if isinstance(value, list) else value
+                           for labels, value in series.items()}
+                    for name, series in self._values.items()}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def flush(self, force=False):
+        """Write this process's values to METRICS_DIR if the flush interval has passed."""
+        if not self.directory or not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        payload = {name: [[list(labels), value] for labels, value in series.items()]
+                   for name, series in self._snapshot().items()}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self._path(os.getpid()))
+
+    def collect(self):
+        """Return {metric name: {labels: value}} summed over every process."""
+        merged = self._snapshot()
+        if not self.directory:
+            return merged
+        own = os.path.basename(self._path(os.getpid()))
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('metrics-') or not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, entries in payload.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                series = merged.setdefault(name, {})
+                for labels, value in entries:
+                    labels = tuple(labels)
+                    series[labels] = metric.merge(series.get(labels), value)
+        return merged
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        values = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.render(values.get(name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    'f1_http_request_duration_seconds', 'Time spent handling a request.',
+    ('endpoint', 'method', 'status'))
+LOADER_SECONDS = registry.histogram(
+    'f1_loader_duration_seconds', 'Time spent loading one race data file.',
+    ('file', 'source'))
+DB_QUERIES = registry.counter(
+    'f1_db_queries_total', 'SQL statements executed.', ('endpoint',))
+DB_QUERY_SECONDS = registry.histogram(
+    'f1_db_query_duration_seconds', 'Time spent executing one SQL statement.', ('endpoint',))
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    'f1_db_queries_per_request', 'SQL statements executed while handling one request.',
+    ('endpoint',), buckets=COUNT_BUCKETS)
+RENDER_SECONDS = registry.histogram(
+    'f1_template_render_seconds', 'Time spent rendering a template.', ('template',))
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    endpoint = _endpoint()
+    DB_QUERIES.inc(endpoint)
+    DB_QUERY_SECONDS.observe(elapsed, endpoint)
+    if has_request_context():
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('metrics_render_start', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    starts = g.get('metrics_render_start')
+    if starts:
+        RENDER_SECONDS.observe(time.perf_counter() - starts.pop(), template.name or 'string')
+
+
+def init_app(app):
+    """Record request, SQL and render timings for app and serve them at /metrics."""
+    registry.configure(app.config['METRICS_ENABLED'], app.config['METRICS_DIR'],
+                       app.config['METRICS_FLUSH_INTERVAL'])
+    if not registry.enabled:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = _endpoint()
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method,
+                                    str(response.status_code))
+            DB_QUERIES_PER_REQUEST.observe(g.pop('metrics_queries', 0), endpoint)
+        registry.flush()
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Expose the collected metrics in the Prometheus text format."""
+        registry.flush(force=True)
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
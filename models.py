@@ -1,14 +1,302 @@
+import re
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.orm import declared_attr
+
+from timeparse import parse_ms
 
 db = SQLAlchemy()
 
 class Race(db.Model):
+    __table_args__ = (db.Index('ix_race_season_race_number', 'season', 'race_number'),)
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     folder_name = db.Column(db.String(120), unique=True, nullable=False)
     race_number = db.Column(db.Integer, nullable=False)
     circuit_name = db.Column(db.String(120), nullable=False)
     date = db.Column(db.Date, nullable=True)
-    
+    # Rows created before seasons existed all belong to the 2024 calendar
+    season = db.Column(db.Integer, nullable=False, default=2024, server_default=text('2024'))
+
+    results = db.relationship('RaceResult', backref='race', lazy='dynamic',
+                              cascade='all, delete-orphan', order_by='RaceResult.id')
+    fastest_laps = db.relationship('FastestLap', backref='race', lazy='dynamic',
+                                   cascade='all, delete-orphan', order_by='FastestLap.id')
+    pit_stops = db.relationship('PitStop', backref='race', lazy='dynamic',
+                                cascade='all, delete-orphan', order_by='PitStop.id')
+    grid_positions = db.relationship('GridPosition', backref='race', lazy='dynamic',
+                                     cascade='all, delete-orphan', order_by='GridPosition.id')
+    summary = db.relationship('RaceSummary', backref='race', uselist=False,
+                              cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<Race {self.name}>'
+
+
+class RaceManifest(db.Model):
+    """Content hash of each race folder as of the last successful sync."""
+    folder_name = db.Column(db.String(120), primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+
+    def __repr__(self):
+        return f'<RaceManifest {self.folder_name} {self.content_hash[:12]}>'
+
+
+def _camel_case(name):
+    head, *rest = name.split('_')
+    return head + ''.join(part.title() for part in rest)
+
+
+def _snake_case(name):
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+class RaceEntryMixin:
+    """
+    Columns shared by every per-race dataset row.
+
+    Rows are stored in file order, so ordering by id reproduces the YAML.
+    Positions such as 'DNF' or 'PL' are kept in the matching *_text column
+    while the integer column stays NULL. Time strings are kept for display
+    and parsed into the matching *_ms integer column.
+    """
+    # Columns holding a finishing or grid position that may be a status code
+    position_columns = ('position',)
+
+    id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=True)
+    position_text = db.Column(db.String(8), nullable=True)
+    driver_number = db.Column(db.Integer, nullable=True)
+    driver_id = db.Column(db.String(80), nullable=False, index=True)
+    constructor_id = db.Column(db.String(80), nullable=False, index=True)
+    engine_manufacturer_id = db.Column(db.String(80), nullable=True)
+    tyre_manufacturer_id = db.Column(db.String(80), nullable=True)
+
+    @declared_attr
+    def race_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (db.Index(f'ix_{cls.__tablename__}_race_position', 'race_id', 'position'),)
+
+    @classmethod
+    def insert_columns(cls):
+        """Return the names of the columns filled from a YAML record."""
+        return tuple(column.name for column in cls.__table__.columns
+                     if column.name not in ('id', 'race_id'))
+
+    @classmethod
+    def record_values(cls, record):
+        """Convert a YAML record into a tuple in insert_columns() order."""
+        row = cls.row_from_record(None, record)
+        return tuple(row[name] for name in cls.insert_columns())
+
+    @classmethod
+    def row_from_record(cls, race_id, record):
+        """Convert a YAML record into a column dict suitable for a bulk insert."""
+        columns = cls.__table__.columns
+        row = {column.name: None for column in columns if column.name != 'id'}
+        row['race_id'] = race_id
+        for key, value in record.items():
+            name = _snake_case(key)
+            if name not in row or name.endswith(('_text', '_ms')):
+                continue
+            if name in cls.position_columns and isinstance(value, str):
+                row[f'{name}_text'] = value
+                value = None
+            elif value is not None and isinstance(columns[name].type, db.String):
+                value = str(value)
+            row[name] = value
+            if f'{name}_ms' in row:
+                row[f'{name}_ms'] = parse_ms(value)
+        if 'grand_slam' in row and row['grand_slam'] is None:
+            row['grand_slam'] = False
+        return row
+
+    def to_dict(self):
+        """Return the row in the same shape as the source YAML record."""
+        record = {}
+        for column in self.__table__.columns:
+            name = column.name
+            if name in ('id', 'race_id') or name.endswith(('_text', '_ms')):
+                continue
+            value = getattr(self, name)
+            if name in self.position_columns and value is None:
+                value = getattr(self, f'{name}_text')
+            elif isinstance(value, float) and value.is_integer():
+                # 25.0 points was 25 in the YAML
+                value = int(value)
+            record[_camel_case(name)] = value
+        return record
+
+
+class RaceResult(RaceEntryMixin, db.Model):
+    position_columns = ('position', 'grid_position')
+
+    laps = db.Column(db.Integer, nullable=True)
+    time = db.Column(db.String(20), nullable=True)
+    time_ms = db.Column(db.Integer, nullable=True)
+    time_penalty = db.Column(db.String(20), nullable=True)
+    time_penalty_ms = db.Column(db.Integer, nullable=True)
+    gap = db.Column(db.String(20), nullable=True)
+    gap_ms = db.Column(db.Integer, nullable=True)
+    interval = db.Column(db.String(20), nullable=True)
+    interval_ms = db.Column(db.Integer, nullable=True)
+    reason_retired = db.Column(db.String(80), nullable=True)
+    # Float for the half points of shortened races
+    points = db.Column(db.Float, nullable=True)
+    grid_position = db.Column(db.Integer, nullable=True)
+    grid_position_text = db.Column(db.String(8), nullable=True)
+    grand_slam = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return f'<RaceResult {self.race_id} {self.position or self.position_text} {self.driver_id}>'
+
+
+class FastestLap(RaceEntryMixin, db.Model):
+    lap = db.Column(db.Integer, nullable=True)
+    time = db.Column(db.String(20), nullable=True)
+    time_ms = db.Column(db.Integer, nullable=True)
+    gap = db.Column(db.String(20), nullable=True)
+    gap_ms = db.Column(db.Integer, nullable=True)
+    interval = db.Column(db.String(20), nullable=True)
+    interval_ms = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<FastestLap {self.race_id} {self.position} {self.driver_id}>'
+
+
+class PitStop(RaceEntryMixin, db.Model):
+    stop = db.Column(db.Integer, nullable=True)
+    lap = db.Column(db.Integer, nullable=True)
+    time = db.Column(db.String(20), nullable=True)
+    time_ms = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<PitStop {self.race_id} {self.driver_id} stop {self.stop}>'
+
+
+class GridPosition(RaceEntryMixin, db.Model):
+    grid_penalty = db.Column(db.String(20), nullable=True)
+    time = db.Column(db.String(20), nullable=True)
+    time_ms = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<GridPosition {self.race_id} {self.position or self.position_text} {self.driver_id}>'
+
+
+class RaceSummary(db.Model):
+    """
+    Winner, pole sitter, fastest lap and retirements of a race for the
+    dashboard cards, rebuilt from its datasets whenever they are ingested.
+    """
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), primary_key=True)
+    winner_driver_id = db.Column(db.String(80), nullable=True)
+    winner_constructor_id = db.Column(db.String(80), nullable=True)
+    winner_time = db.Column(db.String(20), nullable=True)
+    pole_driver_id = db.Column(db.String(80), nullable=True)
+    pole_constructor_id = db.Column(db.String(80), nullable=True)
+    pole_time = db.Column(db.String(20), nullable=True)
+    fastest_lap_driver_id = db.Column(db.String(80), nullable=True)
+    fastest_lap_time = db.Column(db.String(20), nullable=True)
+    fastest_lap_lap = db.Column(db.Integer, nullable=True)
+    classified = db.Column(db.Integer, nullable=False, default=0)
+    retirements = db.Column(db.Integer, nullable=False, default=0)
+    pit_stops = db.Column(db.Integer, nullable=False, default=0)
+
     def __repr__(self):
-        return f'<Race {self.name}>'
\ No newline at end of file
+        return f'<RaceSummary {self.race_id} {self.winner_driver_id}>'
+
+
+# Per-race dataset models, in the order the race page shows them
+RACE_DATA_MODELS = (RaceResult, FastestLap, PitStop, GridPosition)
+
+
+def _widened(existing_type, column):
+    """True when an existing integer column is now fractional, e.g. RaceResult.points."""
+    return (existing_type._type_affinity is db.Integer and
+            issubclass(column.type._type_affinity, (db.Float, db.Numeric)))
+
+
+def _retype_columns(connection, table, columns):
+    """Change the type of existing columns to the model's, keeping their data."""
+    dialect = connection.dialect
+    if dialect.name == 'sqlite':
+        # SQLite can't alter a column: rebuild the table under its new definition
+        for index in db.inspect(connection).get_indexes(table.name):
+            connection.execute(text(f'DROP INDEX {index["name"]}'))
+        connection.execute(text(f'ALTER TABLE {table.name} RENAME TO _old_{table.name}'))
+        table.create(connection)
+        names = ', '.join(column.name for column in table.columns)
+        connection.execute(text(f'INSERT INTO {table.name} ({names}) SELECT {names} FROM _old_{table.name}'))
+        connection.execute(text(f'DROP TABLE _old_{table.name}'))
+        return
+    for column in columns:
+        column_type = column.type.compile(dialect=dialect)
+        if dialect.name == 'mysql':
+            ddl = f'ALTER TABLE {table.name} MODIFY {column.name} {column_type}'
+        else:
+            ddl = f'ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE {column_type}'
+        connection.execute(text(ddl))
+
+
+def upgrade_schema():
+    """
+    Add columns and indexes introduced after a table was first created, and
+    widen integer columns that now hold fractions.
+
+    db.create_all() only creates missing tables, so an existing database
+    would otherwise lack newer columns such as Race.season. New columns must
+    be nullable or carry a server default. Returns the added and retyped
+    columns as 'table.column' names.
+    """
+    added = []
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            columns = {column['name']: column for column in inspector.get_columns(table.name)}
+            existing = set(columns)
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} ' \
+                      f'{column.type.compile(dialect=db.engine.dialect)}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f' DEFAULT {getattr(default, "text", default)}'
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                connection.execute(text(ddl))
+                added.append(f'{table.name}.{column.name}')
+            widened = [column for column in table.columns
+                       if column.name in columns and _widened(columns[column.name]['type'], column)]
+            if widened:
+                _retype_columns(connection, table, widened)
+                added.extend(f'{table.name}.{column.name}' for column in widened)
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
+
+
+def backfill_times():
+    """Fill *_ms columns that are NULL while their time string is set."""
+    for model in RACE_DATA_MODELS:
+        pairs = [(column.name[:-3], column.name) for column in model.__table__.columns
+                 if column.name.endswith('_ms')]
+        source = [getattr(model, name) for name, _ in pairs]
+        missing = db.or_(*(db.and_(getattr(model, name).isnot(None), getattr(model, ms).is_(None))
+                           for name, ms in pairs))
+        rows = db.session.execute(db.select(model.id, *source).where(missing)).all()
+        updates = []
+        for row_id, *values in rows:
+            parsed = {ms: parse_ms(value) for (_, ms), value in zip(pairs, values)}
+            if any(value is not None for value in parsed.values()):
+                updates.append({'id': row_id, **parsed})
+        if updates:
+            db.session.execute(db.update(model), updates)
+    db.session.commit()
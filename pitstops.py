@@ -0,0 +1,226 @@
+"""
+Pit stop analytics for a race and for a whole season.
+
+Each race's stops are fetched once into NumPy arrays (driver and team ids,
+stop number, lap and the pre-parsed time_ms column) and cached with the race
+folder's content hash, like the standings columns. Analyses are computed
+with vectorized grouping over the concatenated arrays:
+
+- per-team and per-driver stop time distributions: median, p90 and best
+- strategy counts: how many drivers made one, two, three... stops in a race
+- lap-window histograms: stops per LAP_WINDOW laps
+
+Race analyses are cached per content hash and season analyses per data
+version, so a page or API request only recomputes after an ingest.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select
+
+from models import PitStop, db
+from timeparse import NO_TIME
+from utils import VersionedCache, race_keys
+
+RaceStops = namedtuple('RaceStops', ['drivers', 'constructors', 'stops', 'laps', 'time_ms'])
+
+# Laps per bar of the lap-window histogram
+LAP_WINDOW = 5
+
+
+def _race_stops(race_ids):
+    """Fetch the stops of a batch of races into {race_id: RaceStops}, in file order."""
+    rows = db.session.execute(
+        select(PitStop.race_id, PitStop.driver_id, PitStop.constructor_id, PitStop.stop,
+               PitStop.lap, PitStop.time_ms)
+        .where(PitStop.race_id.in_(race_ids))
+        .order_by(PitStop.race_id, PitStop.id)).all()
+    grouped = {race_id: [] for race_id in race_ids}
+    for row in rows:
+        grouped[row[0]].append(row[1:])
+    stops = {}
+    for race_id, race_rows in grouped.items():
+        drivers, constructors, numbers, laps, times = zip(*race_rows) if race_rows else ((),) * 5
+        stops[race_id] = RaceStops(
+            np.array(drivers, dtype=object),
+            np.array(constructors, dtype=object),
+            np.array([-1 if value is None else value for value in numbers], dtype=np.int16),
+            np.array([-1 if value is None else value for value in laps], dtype=np.int16),
+            np.array([NO_TIME if value is None else value for value in times], dtype=np.int32))
+    return stops
+
+
+def _quantile(sorted_values, starts, counts, q):
+    """Linear-interpolated quantile q of every group in a group-sorted array."""
+    position = starts + q * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    fraction = position - low
+    return sorted_values[low] * (1 - fraction) + sorted_values[high] * fraction
+
+
+def distribution(codes, values, groups):
+    """
+    Return count, median, p90 and best of values for each group code
+    0..groups-1 as arrays (NaN where a group has no values).
+    """
+    order = np.lexsort((values, codes))
+    sorted_codes = codes[order]
+    sorted_values = values[order].astype(np.float64)
+    counts = np.bincount(sorted_codes, minlength=groups)
+    starts = np.searchsorted(sorted_codes, np.arange(groups))
+
+    median = np.full(groups, np.nan)
+    p90 = np.full(groups, np.nan)
+    best = np.full(groups, np.nan)
+    present = counts > 0
+    median[present] = _quantile(sorted_values, starts[present], counts[present], 0.5)
+    p90[present] = _quantile(sorted_values, starts[present], counts[present], 0.9)
+    best[present] = sorted_values[starts[present]]
+    return counts, median, p90, best
+
+
+def _ms(value):
+    return None if np.isnan(value) else int(round(value))
+
+
+def analyze(race_stops):
+    """Analyze the stops of one or more races (a list of RaceStops)."""
+    race_stops = [stops for stops in race_stops if len(stops.drivers)]
+    if not race_stops:
+        return {'stops': 0, 'timed': 0, 'overall': None, 'constructors': [], 'drivers': [],
+                'strategies': [], 'lap_windows': []}
+
+    drivers = np.concatenate([stops.drivers for stops in race_stops])
+    constructors = np.concatenate([stops.constructors for stops in race_stops])
+    laps = np.concatenate([stops.laps for stops in race_stops])
+    time_ms = np.concatenate([stops.time_ms for stops in race_stops])
+    race_index = np.repeat(np.arange(len(race_stops)), [len(stops.drivers) for stops in race_stops])
+
+    driver_ids, driver_codes = np.unique(drivers, return_inverse=True)
+    team_ids, team_codes = np.unique(constructors, return_inverse=True)
+    timed = time_ms != NO_TIME
+
+    # Each driver's latest team
+    last = np.full(len(driver_ids), -1)
+    np.maximum.at(last, driver_codes, np.arange(len(drivers)))
+    driver_teams = constructors[last]
+
+    def table(ids, codes, extra=None):
+        counts = np.bincount(codes, minlength=len(ids))
+        timed_counts, median, p90, best = distribution(codes[timed], time_ms[timed], len(ids))
+        rows = []
+        for i in np.lexsort((ids, np.nan_to_num(median, nan=np.inf))):
+            row = {'id': ids[i], 'stops': int(counts[i]), 'timed': int(timed_counts[i]),
+                   'median_ms': _ms(median[i]), 'p90_ms': _ms(p90[i]), 'best_ms': _ms(best[i])}
+            if extra is not None:
+                row.update(extra(i))
+            rows.append(row)
+        return rows
+
+    overall = distribution(np.zeros(int(timed.sum()), dtype=np.int64), time_ms[timed], 1)
+
+    # Stops per driver per race -> how many drivers ran each strategy
+    per_race_driver = np.bincount(race_index * len(driver_ids) + driver_codes)
+    strategies = np.bincount(per_race_driver[per_race_driver > 0])
+
+    valid_laps = laps[laps > 0]
+    windows = np.bincount((valid_laps - 1) // LAP_WINDOW) if len(valid_laps) else np.array([], dtype=np.int64)
+
+    return {
+        'stops': len(drivers),
+        'timed': int(timed.sum()),
+        'overall': {'median_ms': _ms(overall[1][0]), 'p90_ms': _ms(overall[2][0]),
+                    'best_ms': _ms(overall[3][0])} if timed.any() else None,
+        'constructors': table(team_ids, team_codes),
+        'drivers': table(driver_ids, driver_codes, lambda i: {'team': driver_teams[i]}),
+        'strategies': [{'stops': stops, 'drivers': int(count)}
+                       for stops, count in enumerate(strategies) if stops and count],
+        'lap_windows': [{'first_lap': i * LAP_WINDOW + 1, 'last_lap': (i + 1) * LAP_WINDOW, 'stops': int(count)}
+                        for i, count in enumerate(windows)],
+    }
+
+
+class PitStopEngine:
+    """Process-wide pit stop arrays and analyses, refreshed one race at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stops = {}
+        self._races = {}
+        self._seasons = VersionedCache(self._lock)
+
+    def _load(self, current):
+        """Make sure the arrays of every (RaceKey, content hash) are cached."""
+        stale = [race.race_id for race, content_hash in current
+                 if content_hash is None or self._stops.get(race.race_id, (None,))[0] != content_hash]
+        if stale:
+            hashes = {race.race_id: content_hash for race, content_hash in current}
+            for race_id, stops in _race_stops(stale).items():
+                self._stops[race_id] = (hashes[race_id], stops)
+                self._races.pop(race_id, None)
+
+    def _race(self, race, content_hash):
+        cached = self._races.get(race.race_id)
+        if cached is None or cached[0] != content_hash or content_hash is None:
+            cached = self._races[race.race_id] = (content_hash, analyze([self._stops[race.race_id][1]]))
+        return cached[1]
+
+    def race(self, race_id):
+        """Return the analysis of one race, or None if it doesn't exist."""
+        current = race_keys(race_id=race_id)
+        if not current:
+            return None
+        with self._lock:
+            self._load(current)
+            return self._race(*current[0])
+
+    def season(self, season):
+        """Return the analysis of a season's races, with a summary row per race."""
+        current = race_keys(season)
+        return self._seasons.get(season, current, lambda previous: self._season(season, current, previous))
+
+    def _season(self, season, current, previous):
+        self._load(current)
+        live = {race.race_id for race, _ in current}
+        analysis = analyze([self._stops[race.race_id][1] for race, _ in current])
+        analysis['season'] = season
+        analysis['races'] = []
+        for race, content_hash in current:
+            race_analysis = self._race(race, content_hash)
+            strategies = race_analysis['strategies']
+            analysis['races'].append({
+                'race': race._asdict(),
+                'stops': race_analysis['stops'],
+                'overall': race_analysis['overall'],
+                'fastest_team': (race_analysis['constructors'][0]['id']
+                                 if race_analysis['constructors'] else None),
+                'common_strategy': (max(strategies, key=lambda item: item['drivers'])['stops']
+                                    if strategies else None),
+            })
+        # Forget races that left the season since the last version
+        for race, _ in previous:
+            if race.race_id not in live:
+                self._stops.pop(race.race_id, None)
+                self._races.pop(race.race_id, None)
+        return analysis
+
+    def clear(self):
+        self._seasons.clear()
+        with self._lock:
+            self._stops = {}
+            self._races = {}
+
+
+pit_stop_engine = PitStopEngine()
+
+
+def race_pit_stops(race_id):
+    """Return the pit stop analysis of one race; see PitStopEngine.race."""
+    return pit_stop_engine.race(race_id)
+
+
+def season_pit_stops(season):
+    """Return the pit stop analysis of a season; see PitStopEngine.season."""
+    return pit_stop_engine.season(season)
@@ -0,0 +1,71 @@
+"""
+Build the race data once in the gunicorn master and share it with workers.
+
+gunicorn.conf.py loads the app before forking (preload_app), so create_app
+runs once: the races folder is ingested, the snapshot is mapped and the
+search index is built before any worker exists. warm() then builds the
+process-wide standings, comparison, pit stop and simulator structures of
+every season, and before_fork() moves everything allocated so far into the
+garbage collector's permanent generation. Workers inherit all of it
+copy-on-write: the snapshot is a read-only shared mapping served from one
+copy in the page cache, and the NumPy buffers and frozen objects stay
+shared because nothing writes to them, so adding a worker adds neither
+memory for the dataset nor warm-up time.
+
+Anything tied to a process is reset in the workers: database connections
+are opened afresh, and the hot-reload thread, which does not survive a
+fork, is started in each worker instead of the master.
+"""
+import gc
+import os
+
+from compare import KINDS, comparison_index
+from models import db
+from pitstops import season_pit_stops
+from search import search_index
+from simulator import simulator_engine
+from standings import constructor_standings, driver_standings
+from utils import race_seasons
+from watcher import RacesWatcher
+
+
+def warm(app):
+    """Build every season's cached structures; returns the number of seasons."""
+    with app.app_context():
+        seasons = race_seasons()
+        search_index.ensure()
+        for key in KINDS.values():
+            comparison_index.postings(key)
+        for season in seasons:
+            driver_standings(season)
+            constructor_standings(season)
+            for key in KINDS.values():
+                comparison_index.postings(key, season)
+            season_pit_stops(season)
+            simulator_engine.matrix(season)
+    return len(seasons)
+
+
+def before_fork(app):
+    """Release the master's connections and threads, and freeze the shared heap."""
+    watcher = app.extensions.pop('races_watcher', None)
+    if watcher is not None:
+        watcher.stop()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    # Objects in the permanent generation are never scanned by the collector,
+    # which would otherwise write to (and so copy) every page they live on
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork(app):
+    """Give a freshly forked worker its own connections and hot-reload thread."""
+    with app.app_context():
+        # Never reuse a connection opened by another process
+        db.engine.dispose(close=False)
+    if app.config['WATCH_RACES'] and os.path.exists(app.config['RACES_FOLDER']):
+        watcher = RacesWatcher(app, app.config['WATCH_INTERVAL'])
+        watcher.start()
+        app.extensions['races_watcher'] = watcher
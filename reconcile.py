@@ -0,0 +1,300 @@
+"""
+Reconcile the Race table with the canonical calendar.
+
+Calendars are data: one YAML file per season in calendars/ listing each
+round's name, circuit, date and the other names the race has been stored
+under ('jap', 'us', 'sao paulo', ...). The calendar is loaded into
+temporary tables, and every operation is computed set-wise in SQL:
+
+- rows whose (normalized) name or alias matches a round are matched to it;
+  when several rows match the same round, the one synced from a race
+  folder (then the lowest id) is kept and the others are deleted with
+  their datasets
+- kept rows whose name, round, circuit or date differ are updated
+- rounds with no matching row are inserted
+- with --prune, rows of a calendar season that match no round are deleted
+
+All of it is applied in one transaction, and --dry-run prints the diff and
+rolls it back. The command runs with INGEST_ON_STARTUP off, so it never
+syncs the races folder itself.
+
+Usage:
+
+    python reconcile.py [--calendars calendars] [--season YEAR] [--prune] [--dry-run]
+"""
+import argparse
+import os
+from collections import namedtuple
+
+import yaml
+from sqlalchemy import (Column, Date, Integer, MetaData, String, Table, and_, delete, exists, func,
+                        insert, literal, or_, select, update)
+
+from config import Config
+from models import FastestLap, GridPosition, PitStop, Race, RaceManifest, RaceResult, RaceSummary, db
+from utils import name_key
+
+CalendarRound = namedtuple('CalendarRound', ['season', 'race_number', 'name', 'circuit_name', 'date',
+                                             'folder_name', 'aliases'])
+
+ReconcilePlan = namedtuple('ReconcilePlan', ['deleted', 'updated', 'inserted'])
+
+# Columns a calendar round sets on its Race row
+CALENDAR_COLUMNS = ('name', 'race_number', 'circuit_name', 'date')
+
+DATASET_MODELS = (RaceResult, FastestLap, PitStop, GridPosition, RaceSummary)
+
+_temp = MetaData()
+
+calendar_table = Table(
+    'reconcile_calendar', _temp,
+    Column('season', Integer, primary_key=True),
+    Column('race_number', Integer, primary_key=True),
+    Column('name', String(120), nullable=False),
+    Column('circuit_name', String(120), nullable=False),
+    Column('date', Date),
+    Column('folder_name', String(120), nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+alias_table = Table(
+    'reconcile_alias', _temp,
+    Column('season', Integer, primary_key=True),
+    Column('name_key', String(120), primary_key=True),
+    Column('race_number', Integer, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+# Race rows matched to a round, ranked so the row to keep comes first
+match_table = Table(
+    'reconcile_match', _temp,
+    Column('race_id', Integer, primary_key=True),
+    Column('season', Integer, nullable=False),
+    Column('race_number', Integer, nullable=False),
+    Column('rank', Integer, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+# Race rows to delete, with why
+delete_table = Table(
+    'reconcile_delete', _temp,
+    Column('race_id', Integer, primary_key=True),
+    Column('reason', String(20), nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+
+class ReconcileConfig(Config):
+    # Reconcile what the database holds; syncing the races folder first
+    # would re-create the rows being cleaned up
+    INGEST_ON_STARTUP = False
+    WATCH_RACES = False
+    METRICS_ENABLED = False
+
+
+def _sql_name_key(column):
+    return func.lower(func.replace(func.replace(func.replace(column, ' ', ''), '_', ''), '-', ''))
+
+
+def default_folder(season, race_number, name, default_season=None):
+    """
+    The folder a round's races are synced from when its calendar entry names
+    none: flat '<n> <name>' for default_season, '<season>/<n> <name>' for
+    the others, as utils.parse_race_path reads them.
+    """
+    folder = f'{race_number} {name.lower()}'
+    return folder if season == default_season else f'{season}/{folder}'
+
+
+def load_calendar(path, default_season=None):
+    """Read one season's calendar file into a list of CalendarRounds."""
+    with open(path, encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    season = int(data['season'])
+    rounds = []
+    keys = {}
+    for entry in data['races']:
+        race_number = int(entry['round'])
+        aliases = [str(alias) for alias in entry.get('aliases', [])]
+        for key in {name_key(name) for name in [entry['name']] + aliases}:
+            if keys.setdefault(key, race_number) != race_number:
+                raise ValueError(f'{path}: {key!r} names both round {keys[key]} and round {race_number}')
+        rounds.append(CalendarRound(
+            season, race_number, entry['name'], entry.get('circuit', entry['name']), entry.get('date'),
+            entry.get('folder', default_folder(season, race_number, entry['name'], default_season)), aliases))
+    numbers = [calendar_round.race_number for calendar_round in rounds]
+    if len(set(numbers)) != len(numbers):
+        raise ValueError(f'{path}: duplicate round numbers')
+    return rounds
+
+
+def load_calendars(folder, seasons=None, default_season=None):
+    """
+    Read every <season>.yml calendar in a folder, optionally only some
+    seasons. Rounds of default_season default to flat folders.
+    """
+    rounds = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(('.yml', '.yaml')):
+            continue
+        season_rounds = load_calendar(os.path.join(folder, name), default_season)
+        if season_rounds and (seasons is None or season_rounds[0].season in seasons):
+            rounds.extend(season_rounds)
+    return rounds
+
+
+def _stage(connection, rounds, prune):
+    """Create the temporary tables and compute the matches and deletes."""
+    _temp.create_all(connection)
+    connection.execute(insert(calendar_table), [
+        {'season': r.season, 'race_number': r.race_number, 'name': r.name,
+         'circuit_name': r.circuit_name, 'date': r.date, 'folder_name': r.folder_name}
+        for r in rounds])
+    connection.execute(insert(alias_table), [
+        {'season': r.season, 'name_key': key, 'race_number': r.race_number}
+        for r in rounds for key in {name_key(name) for name in [r.name] + r.aliases}])
+
+    synced = exists().where(RaceManifest.folder_name == Race.folder_name)
+    rank = func.row_number().over(
+        partition_by=(alias_table.c.season, alias_table.c.race_number),
+        order_by=(synced.desc(), (Race.race_number == alias_table.c.race_number).desc(), Race.id))
+    connection.execute(insert(match_table).from_select(
+        ['race_id', 'season', 'race_number', 'rank'],
+        select(Race.id, alias_table.c.season, alias_table.c.race_number, rank)
+        .join(alias_table, and_(alias_table.c.season == Race.season,
+                                alias_table.c.name_key == _sql_name_key(Race.name)))))
+
+    connection.execute(insert(delete_table).from_select(
+        ['race_id', 'reason'],
+        select(match_table.c.race_id, literal('duplicate')).where(match_table.c.rank > 1)))
+    if prune:
+        connection.execute(insert(delete_table).from_select(
+            ['race_id', 'reason'],
+            select(Race.id, literal('not in calendar'))
+            .where(Race.season.in_(select(calendar_table.c.season).distinct()),
+                   Race.id.not_in(select(match_table.c.race_id)))))
+
+
+def _diff(connection):
+    """Read the planned changes for display, before they are applied."""
+    deleted = connection.execute(
+        select(Race.id, Race.season, Race.race_number, Race.name, Race.folder_name, delete_table.c.reason)
+        .join(delete_table, delete_table.c.race_id == Race.id)
+        .order_by(Race.season, Race.race_number, Race.id)).all()
+
+    changed = or_(*[getattr(Race, column).is_distinct_from(calendar_table.c[column])
+                    for column in CALENDAR_COLUMNS])
+    updated = []
+    query = (select(Race.id, Race.season, *[getattr(Race, column) for column in CALENDAR_COLUMNS],
+                    *[calendar_table.c[column] for column in CALENDAR_COLUMNS])
+             .join(match_table, and_(match_table.c.race_id == Race.id, match_table.c.rank == 1))
+             .join(calendar_table, and_(calendar_table.c.season == match_table.c.season,
+                                        calendar_table.c.race_number == match_table.c.race_number))
+             .where(changed)
+             .order_by(Race.season, calendar_table.c.race_number))
+    for row in connection.execute(query):
+        race_id, season = row[0], row[1]
+        old = row[2:2 + len(CALENDAR_COLUMNS)]
+        new = row[2 + len(CALENDAR_COLUMNS):]
+        updated.append((race_id, season, {column: (before, after)
+                                          for column, before, after in zip(CALENDAR_COLUMNS, old, new)
+                                          if before != after}))
+
+    inserted = connection.execute(
+        select(calendar_table.c.season, calendar_table.c.race_number, calendar_table.c.name,
+               calendar_table.c.folder_name)
+        .where(~exists().where(match_table.c.season == calendar_table.c.season,
+                               match_table.c.race_number == calendar_table.c.race_number,
+                               match_table.c.rank == 1))
+        .order_by(calendar_table.c.season, calendar_table.c.race_number)).all()
+    return ReconcilePlan(deleted, updated, inserted)
+
+
+def _apply(connection):
+    doomed = select(delete_table.c.race_id)
+    for model in DATASET_MODELS:
+        connection.execute(delete(model).where(model.race_id.in_(doomed)))
+    # Forget the folders of deleted rows, so the next sync looks at them afresh
+    connection.execute(delete(RaceManifest).where(
+        RaceManifest.folder_name.in_(select(Race.folder_name).where(Race.id.in_(doomed)))))
+    connection.execute(delete(Race).where(Race.id.in_(doomed)))
+
+    round_of_race = and_(match_table.c.race_id == Race.id, match_table.c.rank == 1,
+                         calendar_table.c.season == match_table.c.season,
+                         calendar_table.c.race_number == match_table.c.race_number)
+    connection.execute(
+        update(Race)
+        .values({column: calendar_table.c[column] for column in CALENDAR_COLUMNS})
+        .where(round_of_race,
+               or_(*[getattr(Race, column).is_distinct_from(calendar_table.c[column])
+                     for column in CALENDAR_COLUMNS])))
+
+    connection.execute(insert(Race).from_select(
+        ['season', 'race_number', 'name', 'circuit_name', 'date', 'folder_name'],
+        select(calendar_table.c.season, calendar_table.c.race_number, calendar_table.c.name,
+               calendar_table.c.circuit_name, calendar_table.c.date, calendar_table.c.folder_name)
+        .where(~exists().where(match_table.c.season == calendar_table.c.season,
+                               match_table.c.race_number == calendar_table.c.race_number,
+                               match_table.c.rank == 1))))
+
+
+def reconcile(rounds, prune=False, dry_run=False):
+    """
+    Bring the Race rows of the calendar seasons in line with rounds, in one
+    transaction; returns the ReconcilePlan. With dry_run=True nothing is
+    changed. Needs an app context.
+    """
+    if not rounds:
+        return ReconcilePlan([], [], [])
+    connection = db.session.connection()
+    try:
+        _stage(connection, rounds, prune)
+        plan = _diff(connection)
+        if not dry_run:
+            _apply(connection)
+        _temp.drop_all(connection)
+    except Exception:
+        db.session.rollback()
+        raise
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return plan
+
+
+def print_plan(plan):
+    for race_id, season, race_number, name, folder_name, reason in plan.deleted:
+        print(f'- delete {season} R{race_number} {name!r} (id={race_id}, folder {folder_name!r}): {reason}')
+    for race_id, season, changes in plan.updated:
+        described = ', '.join(f'{column} {before!r} -> {after!r}' for column, (before, after) in changes.items())
+        print(f'~ update {season} id={race_id}: {described}')
+    for season, race_number, name, folder_name in plan.inserted:
+        print(f'+ insert {season} R{race_number} {name!r} (folder {folder_name!r})')
+    print(f'{len(plan.deleted)} deleted, {len(plan.updated)} updated, {len(plan.inserted)} inserted')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile the races table with the canonical calendar.')
+    parser.add_argument('--calendars', default='calendars', help='folder of <season>.yml calendars')
+    parser.add_argument('--season', type=int, action='append',
+                        help='only reconcile this season (repeatable; default: every calendar)')
+    parser.add_argument('--prune', action='store_true',
+                        help='also delete races of a calendar season that match no round')
+    parser.add_argument('--dry-run', action='store_true', help='print the changes without applying them')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app(ReconcileConfig)
+    rounds = load_calendars(args.calendars, set(args.season) if args.season else None,
+                            app.config['DEFAULT_SEASON'])
+    with app.app_context():
+        plan = reconcile(rounds, prune=args.prune, dry_run=args.dry_run)
+    print_plan(plan)
+    if args.dry_run:
+        print('Dry run: nothing was changed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Push the race data to a remote Postgres/Supabase database.
+
+The Race table, the race manifest, every per-race dataset and the race
+summaries are copied to a target that is either a SQLAlchemy URL (Supabase's Postgres connection
+string, any Postgres or MySQL server, or a SQLite file as a local stand-in)
+or, when no URL is set, the Supabase REST API at SUPABASE_URL. Rows keep
+their local ids and are written with upserts, so a push can be repeated.
+
+Work is split by race: each race has a version (its folder's content hash
+and its Race row), and races whose version changed since the last push are
+grouped into batches of about SYNC_BATCH_ROWS rows. A batch replaces the
+races' rows in one transaction, and batches are written in parallel over a
+pool of SYNC_WORKERS connections. After each batch commits, its races are
+recorded in the checkpoint file, so an interrupted backfill resumes with the
+races it had not reached, and later pushes only send what changed. Races
+deleted locally are deleted from the target.
+
+Usage:
+
+    python remote_sync.py push [--target URL] [--batch-rows N] [--workers N] [--full] [--dry-run]
+    python remote_sync.py schema [--dialect postgresql]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from config import Config
+from models import RACE_DATA_MODELS, Race, RaceManifest, RaceSummary, db
+
+try:
+    from supabase import create_client
+except ImportError:
+    create_client = None
+
+# Tables keyed by race_id, deleted and re-sent with their race
+RACE_CHILD_MODELS = RACE_DATA_MODELS + (RaceSummary,)
+
+# Parents first; deletes run in reverse
+SYNC_MODELS = (Race, RaceManifest) + RACE_CHILD_MODELS
+
+# PostgREST requests carry at most this many rows
+REST_CHUNK_ROWS = 1000
+
+SyncBatch = namedtuple('SyncBatch', ['versions', 'folders', 'rows'])
+
+SyncResult = namedtuple('SyncResult', ['races', 'rows', 'deleted', 'batches'])
+
+
+class SyncConfig(Config):
+    # Push what the database holds; the races folder is synced by the app or ingest.py
+    INGEST_ON_STARTUP = False
+    WATCH_RACES = False
+    METRICS_ENABLED = False
+
+
+def _upsert(connection, table, rows):
+    """Insert rows, replacing those whose primary key already exists."""
+    dialect = connection.dialect.name
+    keys = [column.name for column in table.primary_key]
+    if dialect in ('postgresql', 'sqlite'):
+        insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        statement = insert.on_conflict_do_update(
+            index_elements=keys,
+            set_={column.name: insert.excluded[column.name] for column in table.columns
+                  if column.name not in keys})
+    elif dialect == 'mysql':
+        insert = mysql.insert(table)
+        statement = insert.on_duplicate_key_update(
+            {column.name: insert.inserted[column.name] for column in table.columns if column.name not in keys})
+    else:
+        raise ValueError(f'upserts are not supported on {dialect}')
+    connection.execute(statement, rows)
+
+
+class SqlTarget:
+    """A database reached with a SQLAlchemy URL, written over a connection pool."""
+
+    def __init__(self, url, workers=4):
+        options = {'pool_pre_ping': True}
+        if not url.startswith('sqlite'):
+            options.update(pool_size=workers, max_overflow=0)
+        self.engine = create_engine(url, **options)
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        # SQLite takes one writer at a time
+        self.workers = 1 if self.engine.dialect.name == 'sqlite' else workers
+
+    def create_schema(self):
+        db.metadata.create_all(self.engine, tables=[model.__table__ for model in SYNC_MODELS])
+
+    @staticmethod
+    def _delete(connection, race_ids, folders):
+        for model in reversed(RACE_CHILD_MODELS):
+            connection.execute(delete(model.__table__).where(model.__table__.c.race_id.in_(race_ids)))
+        connection.execute(delete(RaceManifest.__table__).where(RaceManifest.__table__.c.folder_name.in_(folders)))
+        connection.execute(delete(Race.__table__).where(Race.__table__.c.id.in_(race_ids)))
+
+    def delete(self, race_ids, folders):
+        with self.engine.begin() as connection:
+            self._delete(connection, race_ids, folders)
+
+    def write(self, batch):
+        races = Race.__table__
+        with self.engine.begin() as connection:
+            # Rows left by a race that had the folder under another id go first
+            replaced = connection.execute(
+                select(races.c.id).where(races.c.folder_name.in_(batch.folders),
+                                         races.c.id.not_in(list(batch.versions)))).scalars().all()
+            self._delete(connection, list(batch.versions) + replaced, [])
+            for model in SYNC_MODELS:
+                rows = batch.rows[model.__tablename__]
+                if rows:
+                    _upsert(connection, model.__table__, rows)
+
+    def close(self):
+        self.engine.dispose()
+
+
+class RestTarget:
+    """The Supabase REST API; the tables must exist (see `remote_sync.py schema`)."""
+
+    def __init__(self, url, key, workers=4):
+        if create_client is None:
+            raise RuntimeError('the Supabase REST target needs supabase (pip install supabase)')
+        self.client = create_client(url, key)
+        self.name = url
+        self.workers = workers
+
+    def create_schema(self):
+        pass
+
+    def _delete(self, race_ids, folders):
+        for model in reversed(RACE_CHILD_MODELS):
+            self.client.table(model.__tablename__).delete().in_('race_id', race_ids).execute()
+        if folders:
+            self.client.table(RaceManifest.__tablename__).delete().in_('folder_name', folders).execute()
+        self.client.table(Race.__tablename__).delete().in_('id', race_ids).execute()
+
+    def delete(self, race_ids, folders):
+        self._delete(race_ids, folders)
+
+    def write(self, batch):
+        # Not transactional: a batch that fails part way is written again on the next push
+        race_ids = list(batch.versions)
+        existing = self.client.table(Race.__tablename__).select('id').in_('folder_name', batch.folders).execute()
+        replaced = [row['id'] for row in existing.data if row['id'] not in batch.versions]
+        self._delete(race_ids + replaced, [])
+        for model in SYNC_MODELS:
+            rows = [{name: value.isoformat() if isinstance(value, date) else value
+                     for name, value in row.items()}
+                    for row in batch.rows[model.__tablename__]]
+            for start in range(0, len(rows), REST_CHUNK_ROWS):
+                self.client.table(model.__tablename__).upsert(rows[start:start + REST_CHUNK_ROWS]).execute()
+
+    def close(self):
+        pass
+
+
+def open_target(app, url=None, workers=None):
+    """Return the target named by url, SYNC_DATABASE_URI or the Supabase settings."""
+    workers = workers or app.config['SYNC_WORKERS']
+    url = url or app.config['SYNC_DATABASE_URI']
+    if url:
+        return SqlTarget(url, workers)
+    if app.config['SUPABASE_URL'] and app.config['SUPABASE_KEY']:
+        return RestTarget(app.config['SUPABASE_URL'], app.config['SUPABASE_KEY'], workers)
+    raise RuntimeError('set SYNC_DATABASE_URI (or SUPABASE_URL and SUPABASE_KEY) or pass --target')
+
+
+def checkpoint_path(app):
+    """Return the checkpoint file used by a Flask app."""
+    return app.config['SYNC_CHECKPOINT'] or os.path.join(app.instance_path, 'remote-sync.json')
+
+
+def read_checkpoint(path, target_name):
+    """Return {race id: [version, folder]} pushed to a target, empty for another target."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('target') != target_name:
+        return {}
+    return {int(race_id): entry for race_id, entry in checkpoint['races'].items()}
+
+
+def write_checkpoint(path, target_name, races):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'target': target_name, 'races': {str(race_id): entry for race_id, entry in sorted(races.items())}},
+                  f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def race_versions():
+    """Return {race id: (version, folder, season, race_number)} for every local race."""
+    races = Race.__table__
+    rows = db.session.execute(
+        select(races, RaceManifest.content_hash)
+        .outerjoin(RaceManifest, RaceManifest.folder_name == races.c.folder_name)).mappings().all()
+    versions = {}
+    for row in rows:
+        digest = hashlib.sha1(repr(sorted((name, str(value)) for name, value in row.items())).encode('utf-8'))
+        versions[row['id']] = (digest.hexdigest(), row['folder_name'], row['season'], row['race_number'])
+    return versions
+
+
+def plan_batches(race_ids, batch_rows):
+    """Group races, in order, into lists holding about batch_rows dataset rows each."""
+    counts = dict.fromkeys(race_ids, 0)
+    for model in RACE_DATA_MODELS:
+        for race_id, count in db.session.execute(
+                select(model.race_id, func.count()).where(model.race_id.in_(race_ids)).group_by(model.race_id)):
+            counts[race_id] += count
+    batches = []
+    current, size = [], 0
+    for race_id in race_ids:
+        current.append(race_id)
+        size += counts[race_id]
+        if size >= batch_rows:
+            batches.append(current)
+            current, size = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def read_batch(race_ids, versions):
+    """Read the rows of a batch of races from the local database."""
+    folders = [versions[race_id][1] for race_id in race_ids]
+    rows = {}
+    for model in SYNC_MODELS:
+        table = model.__table__
+        if model is Race:
+            where = table.c.id.in_(race_ids)
+        elif model is RaceManifest:
+            where = table.c.folder_name.in_(folders)
+        else:
+            where = table.c.race_id.in_(race_ids)
+        rows[model.__tablename__] = [dict(row) for row in db.session.execute(select(table).where(where)).mappings()]
+    return SyncBatch({race_id: versions[race_id][0] for race_id in race_ids}, folders, rows)
+
+
+def push(target, path, batch_rows=5000, full=False, dry_run=False, log=None):
+    """
+    Push races whose version changed since the checkpoint (every race with
+    full=True) and delete races that no longer exist locally. Returns a
+    SyncResult; with dry_run=True nothing is written. Needs an app context.
+    """
+    checkpoint = read_checkpoint(path, target.name)
+    # A full push resends every race, but still deletes those removed locally
+    pushed = {} if full else dict(checkpoint)
+    versions = race_versions()
+    deleted = sorted(race_id for race_id in checkpoint if race_id not in versions)
+    stale = sorted((race_id for race_id, (version, *_) in versions.items()
+                    if pushed.get(race_id, [None])[0] != version),
+                   key=lambda race_id: versions[race_id][2:] + (race_id,))
+    batches = plan_batches(stale, batch_rows) if stale else []
+    if dry_run:
+        return SyncResult(len(stale), None, len(deleted), len(batches))
+
+    target.create_schema()
+    lock = threading.Lock()
+    if deleted:
+        target.delete(deleted, [checkpoint[race_id][1] for race_id in deleted])
+        for race_id in deleted:
+            pushed.pop(race_id, None)
+        write_checkpoint(path, target.name, pushed)
+
+    rows = 0
+    with ThreadPoolExecutor(max_workers=target.workers) as pool:
+        running = {}
+
+        def finish(done):
+            nonlocal rows
+            for future in done:
+                batch = running.pop(future)
+                future.result()
+                with lock:
+                    for race_id, version in batch.versions.items():
+                        pushed[race_id] = [version, versions[race_id][1]]
+                    write_checkpoint(path, target.name, pushed)
+                rows += sum(len(table_rows) for table_rows in batch.rows.values())
+                if log:
+                    log(f'{len(pushed)}/{len(versions)} races pushed ({rows} rows)')
+
+        try:
+            for race_ids in batches:
+                # Keep at most two batches per connection in memory
+                while len(running) >= 2 * target.workers:
+                    finish(wait(running, return_when=FIRST_COMPLETED).done)
+                batch = read_batch(race_ids, versions)
+                running[pool.submit(target.write, batch)] = batch
+            while running:
+                finish(wait(running, return_when=FIRST_COMPLETED).done)
+        except BaseException:
+            # Let the batches in flight finish and record those that committed
+            pool.shutdown(wait=True, cancel_futures=True)
+            finish([future for future in list(running) if not future.cancelled() and not future.exception()])
+            raise
+    return SyncResult(len(stale), rows, len(deleted), len(batches))
+
+
+def schema_ddl(dialect_name='postgresql'):
+    """Return the CREATE TABLE and CREATE INDEX statements of the synced tables."""
+    dialect = {'postgresql': postgresql, 'mysql': mysql, 'sqlite': sqlite}[dialect_name].dialect()
+    statements = []
+    for model in SYNC_MODELS:
+        table = model.__table__
+        statements.append(str(CreateTable(table).compile(dialect=dialect)).strip() + ';')
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statements.append(str(CreateIndex(index).compile(dialect=dialect)).strip() + ';')
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Push the race data to a remote Postgres/Supabase database.')
+    parser.add_argument('command', choices=['push', 'schema'])
+    parser.add_argument('--target', help='SQLAlchemy URL of the target (default: SYNC_DATABASE_URI, '
+                                         'else the Supabase REST API)')
+    parser.add_argument('--batch-rows', type=int, help='dataset rows per batch (default: SYNC_BATCH_ROWS)')
+    parser.add_argument('--workers', type=int, help='parallel connections (default: SYNC_WORKERS)')
+    parser.add_argument('--full', action='store_true',
+                        help='push every race, ignoring the checkpoint (removed races are still deleted)')
+    parser.add_argument('--dry-run', action='store_true', help='print what would be pushed')
+    parser.add_argument('--dialect', default='postgresql', choices=['postgresql', 'mysql', 'sqlite'],
+                        help='SQL dialect of the schema command')
+    args = parser.parse_args()
+
+    if args.command == 'schema':
+        print('\n\n'.join(schema_ddl(args.dialect)))
+        return
+
+    from app import create_app
+
+    app = create_app(SyncConfig)
+    try:
+        target = open_target(app, args.target, args.workers)
+    except RuntimeError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    try:
+        with app.app_context():
+            result = push(target, checkpoint_path(app), args.batch_rows or app.config['SYNC_BATCH_ROWS'],
+                          full=args.full, dry_run=args.dry_run, log=print)
+    finally:
+        target.close()
+    if args.dry_run:
+        print(f'{target.name}: would push {result.races} races in {result.batches} batches '
+              f'and delete {result.deleted}')
+    else:
+        print(f'{target.name}: pushed {result.races} races ({result.rows} rows) in {result.batches} batches, '
+              f'deleted {result.deleted}, in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""
+In-memory search over drivers, constructors, races and circuits.
+
+Every driver and constructor id, race name and circuit name is split into
+lowercase tokens. A sorted token list answers prefix queries with a binary
+search, and a trigram index over the same tokens finds candidates for typo
+tolerant matching, which are then checked with a bounded edit distance.
+
+The index is built once after the startup ingest and refreshed one race at a
+time when the races folder is synced: each race's contribution is stored
+with its folder's content hash, so only added, changed or removed races are
+read again. Each worker's watcher refreshes its own index after every
+reload, including one another worker applied first, and ensure() compares
+data_version() at most once per check_interval seconds to catch syncs made
+outside the app. Queries in between never touch the database.
+"""
+import bisect
+import hashlib
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+
+from flask import url_for
+from sqlalchemy import select, union
+
+from models import GridPosition, Race, RaceManifest, RaceResult, db
+from utils import data_version
+
+KINDS = ('driver', 'constructor', 'race', 'circuit')
+
+# Prefix hits rank above typo matches, exact tokens above prefixes
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+FUZZY_SCORE = 1.5
+FUZZY_DISTANCE_PENALTY = 0.5
+
+# Shorter query tokens are only matched by prefix
+FUZZY_MIN_LENGTH = 4
+
+# Typo matching checks at most this many tokens, those sharing the most
+# trigrams with the query, which bounds the cost of a keystroke
+FUZZY_CANDIDATES = 40
+
+RaceInfo = namedtuple('RaceInfo', ['race_id', 'season', 'race_number', 'name', 'circuit_name'])
+
+SearchResult = namedtuple('SearchResult', ['kind', 'key', 'label', 'score', 'races', 'seasons', 'race'])
+
+
+def tokenize(text):
+    """'Max-Verstappen' -> ['max', 'verstappen'], with accents removed."""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return [token for token in re.split(r'[^a-z0-9]+', text.lower()) if token]
+
+
+def _trigrams(token):
+    # Anchored at the start only, so a query shares grams with the prefix of a longer token
+    padded = f'^{token}'
+    return {padded[i:i + 3] for i in range(max(1, len(padded) - 2))}
+
+
+def _prefix_distance(query, token, limit):
+    """
+    Edit distance between query and the closest prefix of token (the whole
+    token included), or limit + 1 once every alignment exceeds limit.
+    """
+    # Prefixes more than limit characters longer than the query are too far
+    token = token[:len(query) + limit]
+    previous = list(range(len(token) + 1))
+    for i, char in enumerate(query, 1):
+        current = [i]
+        for j, other in enumerate(token, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous)
+
+
+def _allowed_typos(token):
+    return 1 if len(token) < 8 else 2
+
+
+def _label(kind, key, race=None):
+    if kind == 'race':
+        return f'{race.season} {race.name.title()}'
+    return key.replace('-', ' ').replace('_', ' ').title()
+
+
+class _Document:
+    __slots__ = ('kind', 'key', 'label', 'tokens', 'races')
+
+    def __init__(self, kind, key, label):
+        self.kind = kind
+        self.key = key
+        self.label = label
+        tokens = tokenize(key) + tokenize(label)
+        if len(tokens) > 1:
+            # 'redbull' finds 'red-bull'
+            tokens.append(''.join(tokenize(key)))
+        self.tokens = frozenset(tokens)
+        self.races = set()
+
+
+class SearchIndex:
+    """Process-wide token index over the entities of every race."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._races = {}
+        self._documents = {}
+        self._postings = {}
+        self._tokens = []
+        self._grams = {}
+        self.version = None
+        self.data_version = None
+        # Seconds between checks of data_version() in ensure()
+        self.check_interval = 5.0
+        self._checked = 0.0
+
+    # Index maintenance
+
+    def _add_token(self, token, doc_id):
+        postings = self._postings.get(token)
+        if postings is None:
+            postings = self._postings[token] = set()
+            bisect.insort(self._tokens, token)
+            for gram in _trigrams(token):
+                self._grams.setdefault(gram, set()).add(token)
+        postings.add(doc_id)
+
+    def _remove_token(self, token, doc_id):
+        postings = self._postings[token]
+        postings.discard(doc_id)
+        if not postings:
+            del self._postings[token]
+            del self._tokens[bisect.bisect_left(self._tokens, token)]
+            for gram in _trigrams(token):
+                self._grams[gram].discard(token)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def _attach(self, kind, key, race):
+        doc_id = (kind, key)
+        document = self._documents.get(doc_id)
+        if document is None:
+            document = self._documents[doc_id] = _Document(kind, key, _label(kind, key, race))
+            for token in document.tokens:
+                self._add_token(token, doc_id)
+        document.races.add(race.race_id)
+
+    def _detach(self, kind, key, race_id):
+        doc_id = (kind, key)
+        document = self._documents.get(doc_id)
+        if document is None:
+            return
+        document.races.discard(race_id)
+        if not document.races:
+            for token in document.tokens:
+                self._remove_token(token, doc_id)
+            del self._documents[doc_id]
+
+    def _add_race(self, race, content_hash, drivers, constructors):
+        self._races[race.race_id] = (content_hash, race, drivers, constructors)
+        self._attach('race', race.race_id, race)
+        self._attach('circuit', race.circuit_name, race)
+        for driver in drivers:
+            self._attach('driver', driver, race)
+        for constructor in constructors:
+            self._attach('constructor', constructor, race)
+
+    def _remove_race(self, race_id):
+        _, race, drivers, constructors = self._races.pop(race_id)
+        self._detach('race', race_id, race_id)
+        self._detach('circuit', race.circuit_name, race_id)
+        for driver in drivers:
+            self._detach('driver', driver, race_id)
+        for constructor in constructors:
+            self._detach('constructor', constructor, race_id)
+
+    def refresh(self):
+        """
+        Bring the index up to date with the database; returns the number of
+        races (re-)indexed. Needs an app context.
+        """
+        # Read before the rows, so a sync landing in between is seen next time
+        version = data_version()
+        self._checked = time.monotonic()
+        rows = db.session.execute(
+            select(Race.id, Race.season, Race.race_number, Race.name, Race.circuit_name,
+                   RaceManifest.content_hash)
+            .outerjoin(RaceManifest, RaceManifest.folder_name == Race.folder_name)).all()
+        current = {row[0]: (row[5], RaceInfo(*row[:5])) for row in rows}
+
+        with self._lock:
+            stale = [race_id for race_id, (content_hash, race) in current.items()
+                     if content_hash is None or self._races.get(race_id, (None, None))[:2] != (content_hash, race)]
+            entrants = self._entrants(stale) if stale else {}
+            for race_id in [race_id for race_id in self._races if race_id not in current] + stale:
+                if race_id in self._races:
+                    self._remove_race(race_id)
+            for race_id in stale:
+                drivers, constructors = entrants.get(race_id, (set(), set()))
+                content_hash, race = current[race_id]
+                self._add_race(race, content_hash, frozenset(drivers), frozenset(constructors))
+            self.version = hashlib.sha1(repr(sorted(
+                (race_id, content_hash, race) for race_id, (content_hash, race, _, _) in self._races.items()
+            )).encode('utf-8')).hexdigest()
+            self.data_version = version
+        return len(stale)
+
+    @staticmethod
+    def _entrants(race_ids):
+        """Return {race_id: (driver ids, constructor ids)} from the results and the grid."""
+        entrants = {}
+        query = union(*[
+            select(model.race_id, model.driver_id, model.constructor_id).where(model.race_id.in_(race_ids))
+            for model in (RaceResult, GridPosition)
+        ])
+        for race_id, driver, constructor in db.session.execute(query):
+            drivers, constructors = entrants.setdefault(race_id, (set(), set()))
+            if driver:
+                drivers.add(driver)
+            if constructor:
+                constructors.add(constructor)
+        return entrants
+
+    def ensure(self):
+        """
+        Build the index on first use, and refresh it when the races changed
+        since; the database is checked at most once per check_interval.
+        """
+        if self.version is None:
+            self.refresh()
+            return
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        if self.data_version != data_version():
+            self.refresh()
+
+    # Queries
+
+    def _match_token(self, query, enough):
+        """Return {doc_id: score} for the documents one query token matches."""
+        matches = {}
+        start = bisect.bisect_left(self._tokens, query)
+        for token in self._tokens[start:]:
+            if not token.startswith(query):
+                break
+            score = EXACT_SCORE if token == query else PREFIX_SCORE
+            for doc_id in self._postings[token]:
+                if matches.get(doc_id, 0) < score:
+                    matches[doc_id] = score
+
+        # Years and numbers are matched exactly: '2022' is not a typo of '2024'
+        if len(query) < FUZZY_MIN_LENGTH or query.isdigit() or len(matches) >= enough:
+            return matches
+
+        limit = _allowed_typos(query)
+        grams = _trigrams(query)
+        shared = {}
+        for gram in grams:
+            for token in self._grams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        # Each edit changes at most three trigrams
+        threshold = max(1, len(grams) - 3 * limit)
+        candidates = heapq.nlargest(FUZZY_CANDIDATES, (
+            (count, token) for token, count in shared.items()
+            if count >= threshold and len(token) >= len(query) - limit and not token.startswith(query)))
+        for _, token in candidates:
+            distance = _prefix_distance(query, token, limit)
+            if distance > limit:
+                continue
+            score = FUZZY_SCORE - FUZZY_DISTANCE_PENALTY * (distance - 1)
+            for doc_id in self._postings[token]:
+                if matches.get(doc_id, 0) < score:
+                    matches[doc_id] = score
+        return matches
+
+    def search(self, query, limit=10, kinds=None):
+        """
+        Return up to limit SearchResults whose tokens match every word of the
+        query by prefix or, failing that, within one or two typos. Results
+        are ranked by match quality, then by how many races they cover.
+        Call ensure() first.
+        """
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+        with self._lock:
+            scores = None
+            for word in words:
+                matches = self._match_token(word, limit)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {doc_id: score + matches[doc_id]
+                              for doc_id, score in scores.items() if doc_id in matches}
+                if not scores:
+                    return []
+
+            documents = [self._documents[doc_id] for doc_id in scores
+                         if kinds is None or doc_id[0] in kinds]
+            best = heapq.nsmallest(limit, documents, key=lambda document: (
+                -scores[(document.kind, document.key)], -len(document.races), document.label))
+            return [self._result(document, scores[(document.kind, document.key)]) for document in best]
+
+    def _result(self, document, score):
+        races = [self._races[race_id][1] for race_id in document.races]
+        latest = max(races, key=lambda race: (race.season, race.race_number))
+        seasons = sorted({race.season for race in races})
+        return SearchResult(document.kind, document.key, document.label, score, len(races),
+                            (seasons[0], seasons[-1]), latest)
+
+    def clear(self):
+        with self._lock:
+            self._races = {}
+            self._documents = {}
+            self._postings = {}
+            self._tokens = []
+            self._grams = {}
+            self.version = None
+
+
+search_index = SearchIndex()
+
+
+def result_url(result):
+    """Link a result to its page: a race, the latest race at a circuit, or a comparison."""
+    if result.kind in ('race', 'circuit'):
+        return url_for('race_details', race_id=result.race.race_id)
+    return url_for('compare_page', kind=f'{result.kind}s', a=result.key, season=result.race.season)
+
+
+def result_to_dict(result):
+    """Serialize a SearchResult for the API."""
+    return {
+        'kind': result.kind,
+        'id': result.key,
+        'label': result.label,
+        'races': result.races,
+        'seasons': list(result.seasons),
+        'url': result_url(result),
+    }
+
+
+def search(query, limit=10, kinds=None):
+    """Search drivers, constructors, races and circuits; see SearchIndex.search."""
+    search_index.ensure()
+    return search_index.search(query, limit, kinds)
@@ -0,0 +1,319 @@
+"""
+Championship what-if simulator.
+
+A season's race results are loaded once into dense drivers x races matrices:
+finishing position (0 when not classified), team and who set the fastest
+lap. A points system is then a lookup table indexed by the whole position
+matrix at once, so re-scoring a season under other rules (a different
+points table, best-N results only, a fastest-lap point or none) is a
+handful of array operations.
+
+Monte Carlo scenarios run many trials at once over a trials x drivers x
+races tensor: classified finishers retire at random with a given
+probability, the cars behind them move up, and the re-scored standings of
+every trial are ranked together with the full countback. A single core runs
+about twenty thousand trials per second for a 24-race season.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select
+
+from models import FastestLap, RaceResult, db
+from utils import VersionedCache, race_keys
+
+# Points for 1st, 2nd, 3rd... under the championship's historical systems
+POINTS_SYSTEMS = {
+    '2019': (25, 18, 15, 12, 10, 8, 6, 4, 2, 1),
+    '2010': (25, 18, 15, 12, 10, 8, 6, 4, 2, 1),
+    '2003': (10, 8, 6, 5, 4, 3, 2, 1),
+    '1991': (10, 6, 4, 3, 2, 1),
+    '1961': (9, 6, 4, 3, 2, 1),
+    '1950': (8, 6, 4, 3, 2),
+    'winner-only': (1,),
+}
+
+POINTS_SYSTEM_LABELS = {
+    '2019': '2019-2024 (25-18-15-12-10-8-6-4-2-1, fastest lap 1)',
+    '2010': '2010-2018, 2025- (25-18-15-12-10-8-6-4-2-1)',
+    '2003': '2003-2009 (10-8-6-5-4-3-2-1)',
+    '1991': '1991-2002 (10-6-4-3-2-1)',
+    '1961': '1961-1990 (9-6-4-3-2-1)',
+    '1950': '1950-1959 (8-6-4-3-2)',
+    'winner-only': 'Winner only',
+}
+
+# Points for a fastest lap set in the top 10 when fastest_lap is not given
+POINTS_SYSTEM_FASTEST_LAP = {'2019': 1}
+
+# The rules the seasons in the database were scored under
+DEFAULT_POINTS_SYSTEM = '2019'
+
+# Trials are simulated this many at a time, which bounds memory use
+TRIAL_BATCH = 2000
+
+# Scoring rules: points for 1st, 2nd, 3rd..., points for the fastest lap when
+# set by a finisher in the top fastest_lap_top, and how many of each entity's
+# best race scores count (None for all of them)
+Rules = namedtuple('Rules', ['points', 'fastest_lap', 'fastest_lap_top', 'best_results'])
+Rules.__new__.__defaults__ = (0, 10, None)
+
+
+def rules_from_args(args):
+    """
+    Build Rules from query arguments: system=<POINTS_SYSTEMS key> or
+    points=25,18,15,..., fastest_lap=<points> and best=<results counted>.
+    Without arguments the rules reproduce the real standings; fastest_lap
+    defaults to the system's own fastest-lap point, 0 for custom points.
+    Raises ValueError for anything malformed.
+    """
+    if args.get('points'):
+        points = tuple(float(value) for value in args['points'].split(','))
+        if len(points) > 40 or not all(math.isfinite(value) and value >= 0 for value in points):
+            raise ValueError('points must be up to 40 finite, non-negative values')
+        default_fastest_lap = 0
+    else:
+        system = args.get('system') or DEFAULT_POINTS_SYSTEM
+        if system not in POINTS_SYSTEMS:
+            raise ValueError(f'unknown points system {system!r}')
+        points = POINTS_SYSTEMS[system]
+        default_fastest_lap = POINTS_SYSTEM_FASTEST_LAP.get(system, 0)
+    fastest_lap = args.get('fastest_lap')
+    fastest_lap = float(fastest_lap) if fastest_lap else default_fastest_lap
+    best = args.get('best')
+    best_results = int(best) if best else None
+    if not (math.isfinite(fastest_lap) and fastest_lap >= 0) or (best_results is not None and best_results < 1):
+        raise ValueError('fastest_lap must be finite and >= 0, and best >= 1')
+    return Rules(points, fastest_lap, 10, best_results)
+
+
+SeasonMatrix = namedtuple('SeasonMatrix', ['races', 'drivers', 'teams', 'positions', 'team_codes',
+                                           'entered', 'fastest'])
+
+
+def load_matrix(races):
+    """Build the SeasonMatrix of a list of RaceKeys, in two queries."""
+    race_ids = [race.race_id for race in races]
+    column = {race_id: i for i, race_id in enumerate(race_ids)}
+    results = db.session.execute(
+        select(RaceResult.race_id, RaceResult.driver_id, RaceResult.constructor_id, RaceResult.position)
+        .where(RaceResult.race_id.in_(race_ids))
+        .order_by(RaceResult.race_id, RaceResult.id)).all()
+    fastest = db.session.execute(
+        select(FastestLap.race_id, FastestLap.driver_id)
+        .where(FastestLap.race_id.in_(race_ids), FastestLap.position == 1)).all()
+
+    drivers = np.array(sorted({row[1] for row in results}), dtype=object)
+    teams = np.array(sorted({row[2] for row in results}), dtype=object)
+    driver_index = {driver: i for i, driver in enumerate(drivers)}
+    team_index = {team: i for i, team in enumerate(teams)}
+
+    shape = (len(drivers), len(races))
+    positions = np.zeros(shape, dtype=np.int16)
+    team_codes = np.full(shape, -1, dtype=np.int32)
+    for race_id, driver, team, position in results:
+        d, r = driver_index[driver], column[race_id]
+        positions[d, r] = position or 0
+        team_codes[d, r] = team_index[team]
+    fastest_matrix = np.zeros(shape, dtype=bool)
+    for race_id, driver in fastest:
+        if driver in driver_index:
+            fastest_matrix[driver_index[driver], column[race_id]] = True
+    return SeasonMatrix(races, drivers, teams, positions, team_codes, team_codes >= 0, fastest_matrix)
+
+
+def points_lookup(rules, max_position):
+    """Return an array mapping finishing position (0 = not classified) to points."""
+    lookup = np.zeros(max(max_position, len(rules.points)) + 1, dtype=np.float64)
+    lookup[1:len(rules.points) + 1] = rules.points
+    return lookup
+
+
+def race_points(matrix, rules, positions):
+    """
+    Score positions (drivers x races, or trials x drivers x races) under
+    rules; returns float points of the same shape.
+    """
+    lookup = points_lookup(rules, int(matrix.positions.max(initial=0)))
+    points = lookup[positions]
+    if rules.fastest_lap:
+        points += rules.fastest_lap * (matrix.fastest & (positions >= 1) & (positions <= rules.fastest_lap_top))
+    return points
+
+
+def by_team(matrix, values):
+    """Sum a (..., drivers, races) array into (..., teams, races) by each car's team."""
+    leading = values.shape[:-2]
+    teams, races = len(matrix.teams), len(matrix.races)
+    flat = values.reshape(-1, *values.shape[-2:])
+    batch = np.arange(flat.shape[0])[:, None, None] * (teams * races)
+    index = batch + np.where(matrix.entered, matrix.team_codes * races + np.arange(races), 0)
+    summed = np.bincount(index.ravel(), weights=(flat * matrix.entered).ravel(),
+                         minlength=flat.shape[0] * teams * races)
+    return summed.reshape(*leading, teams, races)
+
+
+def season_totals(points, best_results=None):
+    """Sum race points over the last axis, counting only the best_results scores when set."""
+    if best_results is not None and best_results < points.shape[-1]:
+        return np.sort(points, axis=-1)[..., points.shape[-1] - best_results:].sum(axis=-1)
+    return points.sum(axis=-1)
+
+
+def _countback(points, finish_counts):
+    """Championship order: points, then most wins, seconds, thirds... then entity order."""
+    keys = [np.arange(len(points))]
+    keys.extend(-finish_counts[:, p] for p in range(finish_counts.shape[1] - 1, -1, -1))
+    keys.append(-points)
+    return np.lexsort(keys)
+
+
+def _finish_counts(matrix, positions, kind):
+    """
+    (trials x entities x positions) number of 1st, 2nd, 3rd... places of
+    trials x drivers x races positions, in one bincount.
+    """
+    trials = positions.shape[0]
+    max_position = max(int(matrix.positions.max(initial=0)), 1)
+    if kind == 'constructors':
+        entity = np.broadcast_to(matrix.team_codes, positions.shape)
+        count = len(matrix.teams)
+    else:
+        entity = np.broadcast_to(np.arange(len(matrix.drivers))[:, None], positions.shape)
+        count = len(matrix.drivers)
+    trial = np.arange(trials)[:, None, None]
+    finished = positions > 0
+    index = ((trial * count + entity) * max_position + positions - 1)[finished]
+    return np.bincount(index, minlength=trials * count * max_position).reshape(trials, count, max_position)
+
+
+def _entities(matrix, kind):
+    return matrix.teams if kind == 'constructors' else matrix.drivers
+
+
+def _driver_teams(matrix):
+    """Each driver's team in their latest race."""
+    last = matrix.entered.shape[1] - 1 - np.argmax(matrix.entered[:, ::-1], axis=1)
+    return matrix.teams[matrix.team_codes[np.arange(len(matrix.drivers)), last]]
+
+
+def score(matrix, rules, kind='drivers'):
+    """
+    Re-score a season under rules; returns ranked rows with the points and
+    position each entity would have had.
+    """
+    if not len(matrix.drivers):
+        return []
+    points = race_points(matrix, rules, matrix.positions)
+    if kind == 'constructors':
+        points = by_team(matrix, points)
+    totals = season_totals(points, rules.best_results)
+    counts = _finish_counts(matrix, matrix.positions[None], kind)[0]
+    entities = _entities(matrix, kind)
+    teams = _driver_teams(matrix) if kind == 'drivers' else None
+
+    rows = []
+    for position, i in enumerate(_countback(totals, counts), 1):
+        rows.append({
+            'position': position,
+            'id': entities[i],
+            'team': teams[i] if teams is not None else None,
+            'points': float(totals[i]),
+            'wins': int(counts[i, 0]),
+            'points_by_round': points[i].tolist(),
+        })
+    return rows
+
+
+def simulate_dnfs(matrix, rules, trials, dnf_rate, kind='drivers', seed=None):
+    """
+    Monte Carlo: in each trial every classified finisher retires with
+    probability dnf_rate and the cars behind move up. Returns one row per
+    entity with its mean points, title and podium odds, and the probability
+    of each final championship position, best title odds first.
+    """
+    entities = _entities(matrix, kind)
+    count = len(entities)
+    if not count or trials <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    classified = matrix.positions > 0
+
+    # Drivers in finishing order per race; retirements leave the order unchanged
+    order = np.argsort(np.where(classified, matrix.positions, np.iinfo(np.int16).max), axis=0, kind='stable')
+    inverse = np.argsort(order, axis=0)
+    sorted_classified = np.take_along_axis(classified, order, axis=0)
+
+    total_points = np.zeros(count)
+    position_counts = np.zeros((count, count), dtype=np.int64)
+    done = 0
+    while done < trials:
+        batch = min(TRIAL_BATCH, trials - done)
+        survives = sorted_classified & (rng.random((batch,) + sorted_classified.shape) >= dnf_rate)
+        new_sorted = np.cumsum(survives, axis=1, dtype=np.int16) * survives
+        positions = np.take_along_axis(new_sorted, np.broadcast_to(inverse, new_sorted.shape), axis=1)
+
+        points = race_points(matrix, rules, positions)
+        if kind == 'constructors':
+            points = by_team(matrix, points)
+        totals = season_totals(points, rules.best_results)
+
+        # Rank every trial at once: points, then countback, then entity order
+        keys = [np.broadcast_to(np.arange(count), totals.shape)]
+        finishes = _finish_counts(matrix, positions, kind)
+        keys.extend(-finishes[..., p] for p in range(finishes.shape[-1] - 1, -1, -1))
+        keys.append(-totals)
+        ranking = np.lexsort(keys, axis=-1)
+        places = np.empty_like(ranking)
+        np.put_along_axis(places, ranking, np.arange(count), axis=1)
+        position_counts += np.bincount((np.arange(count) * count + places).ravel(),
+                                       minlength=count * count).reshape(count, count)
+        total_points += totals.sum(axis=0)
+        done += batch
+
+    probabilities = position_counts / trials
+    mean_position = probabilities @ np.arange(1, count + 1)
+    teams = _driver_teams(matrix) if kind == 'drivers' else None
+    rows = []
+    for i in np.lexsort((mean_position, -probabilities[:, 0])):
+        reached = np.flatnonzero(position_counts[i])
+        rows.append({
+            'id': entities[i],
+            'team': teams[i] if teams is not None else None,
+            'mean_points': float(total_points[i] / trials),
+            'champion': float(probabilities[i, 0]),
+            'podium': float(probabilities[i, :3].sum()),
+            'mean_position': float(mean_position[i]),
+            'best_position': int(reached[0]) + 1,
+            'worst_position': int(reached[-1]) + 1,
+            'position_probabilities': probabilities[i].tolist(),
+        })
+    return rows
+
+
+class SimulatorEngine:
+    """Process-wide season matrices, rebuilt when a season's data changes."""
+
+    def __init__(self):
+        self._matrices = VersionedCache()
+
+    def matrix(self, season):
+        current = race_keys(season)
+        return self._matrices.get(season, current, lambda previous: load_matrix([race for race, _ in current]))
+
+    def clear(self):
+        self._matrices.clear()
+
+
+simulator_engine = SimulatorEngine()
+
+
+def what_if(season, rules, kind='drivers'):
+    """Return a season's standings re-scored under rules; see score."""
+    return score(simulator_engine.matrix(season), rules, kind)
+
+
+def monte_carlo(season, rules, trials, dnf_rate, kind='drivers', seed=None):
+    """Return championship odds under random retirements; see simulate_dnfs."""
+    return simulate_dnfs(simulator_engine.matrix(season), rules, trials, dnf_rate, kind, seed)
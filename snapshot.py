@@ -0,0 +1,425 @@
+"""
+Binary columnar snapshot of the races/ YAML tree.
+
+The snapshot stores every dataset (results, fastest laps, pit stops and
+grid) as int32 columns with all strings interned into a single table (and
+the rare fractional numbers, such as half points, into a float table), so the
+app can memory-map one file instead of parsing 96 YAML documents. Layout:
+
+    magic (8 bytes) | header length (uint32) | JSON header | column blob
+
+The header records the content hash of the source tree, the string table,
+per-race row ranges and the byte offset of each column inside the blob.
+Every time, gap and interval column also gets a parsed int32 milliseconds
+column (see timeparse.py), read with RaceSnapshot.times().
+
+Build it with:
+
+    python snapshot.py build --races races --output instance/races.snapshot
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from cache import parse_yaml_file
+from timeparse import NO_TIME, TIME_FIELDS, ms_array
+
+MAGIC = b'F1SNAP03'
+
+# Dataset name -> YAML file inside each race folder
+DATASETS = {
+    'results': 'race-results.yml',
+    'fastest_laps': 'fastest-laps.yml',
+    'pit_stops': 'pit-stops.yml',
+    'grid': 'starting-grid-positions.yml',
+}
+
+# Sentinels stored in int32 columns
+NONE = NO_TIME
+ABSENT = -2 ** 31 + 1
+
+_MISSING = object()
+
+_lock = threading.Lock()
+_current = None
+
+
+def is_season_folder(name):
+    """Return True for a '<year>' directory holding one season's race folders."""
+    return len(name) == 4 and name.isdigit()
+
+
+def iter_race_folders(races_folder):
+    """
+    Yield race folders relative to races_folder, in a deterministic order.
+
+    Both the flat '<n> <name>' layout and the per-season
+    '<year>/<n> <name>' layout are supported; nested folders are yielded
+    with a '/' separator.
+    """
+    for item in sorted(os.listdir(races_folder)):
+        path = os.path.join(races_folder, item)
+        if item == 'uploads' or not os.path.isdir(path):
+            continue
+        if is_season_folder(item):
+            for race in sorted(os.listdir(path)):
+                if os.path.isdir(os.path.join(path, race)):
+                    yield f'{item}/{race}'
+        else:
+            yield item
+
+
+def folder_hash(races_folder, folder):
+    """Return a SHA-256 over the names and bytes of one race folder's data files."""
+    digest = hashlib.sha256()
+    for filename in sorted(DATASETS.values()):
+        path = os.path.join(races_folder, folder, filename)
+        if not os.path.exists(path):
+            continue
+        digest.update(f'{filename}\0'.encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def folder_hashes(races_folder):
+    """Return {folder name: content hash} for every race folder."""
+    return {folder: folder_hash(races_folder, folder)
+            for folder in iter_race_folders(races_folder)}
+
+
+def source_hash(races_folder, hashes=None):
+    """Return a SHA-256 over the whole races tree."""
+    if hashes is None:
+        hashes = folder_hashes(races_folder)
+    digest = hashlib.sha256()
+    for folder in sorted(hashes):
+        digest.update(f'{folder}\0{hashes[folder]}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _column_kind(values):
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return 'int'
+    if kinds == {bool}:
+        return 'bool'
+    if kinds == {int}:
+        return 'int'
+    if kinds == {str}:
+        return 'str'
+    # Anything else, floats included, is tagged value by value
+    return 'mixed'
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings = []
+        self._index = {}
+
+    def intern(self, value):
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def build_snapshot(races_folder, output_path, hashes=None):
+    """Compile the races folder into a snapshot file and return its header."""
+    strings = _StringTable()
+    floats = _StringTable()
+    header = {
+        'source_hash': source_hash(races_folder, hashes),
+        'races_folder': os.path.abspath(races_folder),
+        'files': {},
+        'datasets': {},
+    }
+    blob = bytearray()
+
+    rows_by_dataset = {name: [] for name in DATASETS}
+    ranges = {name: {} for name in DATASETS}
+    for folder in iter_race_folders(races_folder):
+        header['files'][folder] = {}
+        for name, filename in DATASETS.items():
+            path = os.path.join(races_folder, folder, filename)
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            header['files'][folder][filename] = [stat.st_mtime_ns, stat.st_size]
+            rows = parse_yaml_file(path) or []
+            start = len(rows_by_dataset[name])
+            rows_by_dataset[name].extend(rows)
+            ranges[name][folder] = [start, len(rows_by_dataset[name])]
+
+    for name, rows in rows_by_dataset.items():
+        fields = []
+        for row in rows:
+            for key in row:
+                if key not in fields:
+                    fields.append(key)
+
+        columns = {}
+        for field in fields:
+            values = [row.get(field) for row in rows]
+            kind = _column_kind(values)
+            codes = array('i')
+            tags = array('b')
+            for row in rows:
+                if field not in row:
+                    codes.append(ABSENT)
+                    tags.append(0)
+                    continue
+                value = row[field]
+                if value is None:
+                    codes.append(NONE)
+                    tags.append(0)
+                elif isinstance(value, str):
+                    codes.append(strings.intern(value))
+                    tags.append(1)
+                elif isinstance(value, float):
+                    codes.append(floats.intern(value))
+                    tags.append(2)
+                else:
+                    codes.append(int(value))
+                    tags.append(0)
+
+            column = {'kind': kind, 'offset': len(blob), 'length': len(codes)}
+            blob += codes.tobytes()
+            if kind == 'mixed':
+                column['tags_offset'] = len(blob)
+                blob += tags.tobytes()
+            blob += b'\0' * (-len(blob) % 8)
+            columns[field] = column
+
+        times = {}
+        for field in TIME_FIELDS:
+            if field in fields:
+                parsed = ms_array(row.get(field) for row in rows)
+                times[field] = {'offset': len(blob), 'length': len(parsed)}
+                blob += parsed.tobytes()
+                blob += b'\0' * (-len(blob) % 8)
+
+        header['datasets'][name] = {
+            'rows': len(rows),
+            'fields': fields,
+            'columns': columns,
+            'times': times,
+            'races': ranges[name],
+        }
+
+    header['strings'] = strings.strings
+    header['floats'] = floats.strings
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    prefix = MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+    prefix += b'\0' * (-len(prefix) % 8)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix)
+        f.write(blob)
+    # Replace atomically so processes that mapped the old file keep a valid view
+    os.replace(tmp_path, output_path)
+    return header
+
+
+class RaceSnapshot:
+    """Read-only, memory-mapped view over a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f'{path} is not a race data snapshot')
+        (header_len,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[header_start:header_start + header_len])
+        blob_start = header_start + header_len
+        self._blob_start = blob_start + (-blob_start % 8)
+        self._view = memoryview(self._mmap)
+        self.strings = self.header['strings']
+        self.floats = self.header['floats']
+        self.source_hash = self.header['source_hash']
+        self.races_folder = self.header['races_folder']
+
+    def column(self, dataset, field):
+        """Return a zero-copy int32 view over a whole column."""
+        column = self.header['datasets'][dataset]['columns'][field]
+        start = self._blob_start + column['offset']
+        return self._view[start:start + column['length'] * 4].cast('i')
+
+    def times(self, dataset, field, folder=None):
+        """
+        Return a zero-copy int32 view of a time field in milliseconds, for
+        the whole dataset or one race folder. Missing times are NO_TIME.
+        """
+        column = self.header['datasets'][dataset]['times'][field]
+        start = self._blob_start + column['offset']
+        view = self._view[start:start + column['length'] * 4].cast('i')
+        if folder is None:
+            return view
+        bounds = self.race_range(dataset, folder)
+        if bounds is None:
+            return view[0:0]
+        return view[bounds[0]:bounds[1]]
+
+    def _tags(self, dataset, field):
+        column = self.header['datasets'][dataset]['columns'][field]
+        start = self._blob_start + column['tags_offset']
+        return self._view[start:start + column['length']].cast('b')
+
+    def race_range(self, dataset, folder):
+        """Return the (start, stop) row range of a race, or None."""
+        bounds = self.header['datasets'][dataset]['races'].get(folder)
+        return tuple(bounds) if bounds else None
+
+    def rows(self, dataset, folder):
+        """Materialize the rows of one race as a list of dicts."""
+        bounds = self.race_range(dataset, folder)
+        if bounds is None:
+            return []
+        start, stop = bounds
+        meta = self.header['datasets'][dataset]
+        strings = self.strings
+        decoded = []
+        for field in meta['fields']:
+            kind = meta['columns'][field]['kind']
+            codes = self.column(dataset, field)[start:stop]
+            tags = self._tags(dataset, field)[start:stop] if kind == 'mixed' else None
+            values = []
+            for i, code in enumerate(codes):
+                if code == ABSENT:
+                    values.append(_MISSING)
+                elif code == NONE:
+                    values.append(None)
+                elif kind == 'str' or (tags is not None and tags[i] == 1):
+                    values.append(strings[code])
+                elif tags is not None and tags[i] == 2:
+                    values.append(self.floats[code])
+                elif kind == 'bool':
+                    values.append(bool(code))
+                else:
+                    values.append(code)
+            decoded.append((field, values))
+
+        result = []
+        for i in range(stop - start):
+            result.append({field: values[i] for field, values in decoded
+                           if values[i] is not _MISSING})
+        return result
+
+    def load(self, race_folder, filename):
+        """
+        Return the rows of a race file, or None if the snapshot can't serve it.
+
+        The snapshot only answers for files whose mtime and size still match
+        the ones recorded at build time; anything else falls back to YAML.
+        """
+        folder = os.path.relpath(os.path.abspath(race_folder), self.races_folder).replace(os.sep, '/')
+        stamp = self.header['files'].get(folder, {}).get(filename)
+        if stamp is None:
+            return None
+        try:
+            stat = os.stat(os.path.join(race_folder, filename))
+        except FileNotFoundError:
+            return None
+        if [stat.st_mtime_ns, stat.st_size] != stamp:
+            return None
+        for dataset, dataset_file in DATASETS.items():
+            if dataset_file == filename:
+                try:
+                    return self.rows(dataset, folder)
+                except ValueError:
+                    # Closed by a reload in another thread
+                    return None
+        return None
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a column view; the mapping goes with the last one
+            pass
+
+
+def ensure_snapshot(races_folder, output_path, hashes=None):
+    """
+    Attach the snapshot for a races folder, rebuilding it if it is stale.
+
+    Pass precomputed folder hashes to avoid reading the tree twice.
+    Returns the attached RaceSnapshot.
+    """
+    global _current
+    current_hash = source_hash(races_folder, hashes)
+    attached = _current
+    if (attached is not None and attached.path == output_path and attached.source_hash == current_hash
+            and attached.races_folder == os.path.abspath(races_folder)):
+        return attached
+    snapshot = None
+    if os.path.exists(output_path):
+        try:
+            snapshot = RaceSnapshot(output_path)
+        except (ValueError, OSError):
+            snapshot = None
+        if snapshot is not None and (snapshot.source_hash != current_hash or
+                                     snapshot.races_folder != os.path.abspath(races_folder)):
+            snapshot.close()
+            snapshot = None
+    if snapshot is None:
+        build_snapshot(races_folder, output_path, hashes)
+        snapshot = RaceSnapshot(output_path)
+
+    with _lock:
+        previous, _current = _current, snapshot
+    if previous is not None and previous is not snapshot:
+        previous.close()
+    return snapshot
+
+
+def snapshot_path(app):
+    """Return the snapshot file used by a Flask app."""
+    return app.config['SNAPSHOT_PATH'] or os.path.join(app.instance_path, 'races.snapshot')
+
+
+def current():
+    """Return the attached snapshot, or None."""
+    return _current
+
+
+def detach():
+    """Stop serving loads from the snapshot; loaders fall back to YAML."""
+    global _current
+    with _lock:
+        _current = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile race YAML into a snapshot file.')
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('--races', default=os.environ.get('RACES_FOLDER', 'races'))
+    parser.add_argument('--output', default=os.path.join('instance', 'races.snapshot'))
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        header = build_snapshot(args.races, args.output)
+        rows = {name: meta['rows'] for name, meta in header['datasets'].items()}
+        print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes, "
+              f"{len(header['strings'])} strings, rows={rows})")
+    else:
+        snapshot = RaceSnapshot(args.output)
+        stale = snapshot.source_hash != source_hash(args.races)
+        print(f"{args.output}: hash={snapshot.source_hash[:12]} "
+              f"races={len(snapshot.header['files'])} stale={stale}")
+
+
+if __name__ == '__main__':
+    main()
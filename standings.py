@@ -0,0 +1,162 @@
+"""
+Championship standings built from driver x race and constructor x race
+points matrices.
+
+Each race contributes one column, fetched from the race_result table and
+cached together with the race folder's content hash. When a folder changes
+only its column is fetched again; the cumulative tables, per-round positions
+and countback tie-breaks are then rebuilt with vectorized NumPy/pandas
+operations over the whole matrix.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from models import RaceResult, db
+from utils import VersionedCache, race_keys
+
+Standings = namedtuple('Standings', ['rounds', 'rows'])
+
+_RESULT_COLUMNS = ['driver_id', 'constructor_id', 'position', 'points']
+
+
+def _race_frame(race_id):
+    """Fetch the finishing positions and points of one race."""
+    rows = db.session.execute(
+        select(RaceResult.driver_id, RaceResult.constructor_id,
+               RaceResult.position, RaceResult.points)
+        .where(RaceResult.race_id == race_id)
+        .order_by(RaceResult.id)
+    ).all()
+    frame = pd.DataFrame(rows, columns=_RESULT_COLUMNS)
+    frame['position'] = frame['position'].astype('float64')
+    frame['points'] = frame['points'].astype('float64').fillna(0)
+    return frame
+
+
+def _countback_order(cumulative_points, cumulative_counts, names):
+    """
+    Return championship positions for one round.
+
+    Entities are ordered by points, then by number of wins, seconds, thirds
+    and so on (countback), then by name so ties that survive countback are
+    still deterministic.
+    """
+    keys = [names]
+    keys.extend(-cumulative_counts[:, p] for p in range(cumulative_counts.shape[1] - 1, -1, -1))
+    keys.append(-cumulative_points)
+    order = np.lexsort(keys)
+    positions = np.empty(len(order), dtype=np.int32)
+    positions[order] = np.arange(1, len(order) + 1, dtype=np.int32)
+    return positions
+
+
+def build_standings(rounds, frames, key):
+    """
+    Build the standings for one entity kind ('driver_id' or 'constructor_id').
+
+    frames holds one results DataFrame per round, in round order.
+    """
+    if not frames:
+        return Standings(rounds, [])
+
+    combined = pd.concat([frame.assign(round=i) for i, frame in enumerate(frames)],
+                         ignore_index=True)
+    round_index = range(len(frames))
+
+    # Entity x round points matrix and running totals
+    points = combined.pivot_table(index=key, columns='round', values='points',
+                                  aggfunc='sum', fill_value=0)
+    points = points.reindex(columns=round_index, fill_value=0).sort_index()
+    cumulative = points.to_numpy().cumsum(axis=1)
+    entities = points.index
+
+    # Entity x round x finishing-position counts for countback
+    finishes = combined.dropna(subset=['position'])
+    max_position = int(finishes['position'].max()) if len(finishes) else 1
+    counts = pd.crosstab([finishes[key], finishes['round']],
+                         finishes['position'].astype(int))
+    full_index = pd.MultiIndex.from_product([entities, round_index])
+    counts = counts.reindex(index=full_index, columns=range(1, max_position + 1), fill_value=0)
+    cumulative_counts = counts.to_numpy().reshape(
+        len(entities), len(frames), max_position).cumsum(axis=1)
+
+    names = np.arange(len(entities))
+    positions = np.column_stack([
+        _countback_order(cumulative[:, r], cumulative_counts[:, r], names)
+        for r in round_index
+    ])
+
+    teams = None
+    if key == 'driver_id':
+        teams = combined.groupby('driver_id')['constructor_id'].last()
+
+    rows = []
+    final_positions = positions[:, -1]
+    for i in np.argsort(final_positions):
+        entity = entities[i]
+        rows.append({
+            'position': int(final_positions[i]),
+            'id': entity,
+            'team': teams[entity] if teams is not None else None,
+            'points': float(cumulative[i, -1]),
+            'wins': int(cumulative_counts[i, -1, 0]),
+            'points_by_round': points.iloc[i].tolist(),
+            'cumulative_points': cumulative[i].tolist(),
+            'positions_by_round': positions[i].tolist(),
+        })
+    return Standings(rounds, rows)
+
+
+class StandingsEngine:
+    """Process-wide standings cache, refreshed one race column at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._seasons = VersionedCache(self._lock)
+
+    def standings(self, key, season):
+        """Return the Standings of a season for 'driver_id' or 'constructor_id'."""
+        current = race_keys(season)
+        rounds, frames, tables = self._seasons.get(
+            season, current, lambda previous: self._refresh(previous, current))
+        with self._lock:
+            if key not in tables:
+                tables[key] = build_standings(rounds, frames, key)
+            return tables[key]
+
+    def _refresh(self, previous, current):
+        """Fetch the changed columns; returns (rounds, frames, {key: Standings})."""
+        live = set()
+        for race_round, content_hash in current:
+            live.add(race_round.race_id)
+            cached = self._frames.get(race_round.race_id)
+            if cached is None or cached[0] != content_hash or content_hash is None:
+                self._frames[race_round.race_id] = (content_hash, _race_frame(race_round.race_id))
+        for race_round, _ in previous:
+            if race_round.race_id not in live:
+                self._frames.pop(race_round.race_id, None)
+        rounds = [race_round for race_round, _ in current]
+        return rounds, [self._frames[race_round.race_id][1] for race_round in rounds], {}
+
+    def clear(self):
+        self._seasons.clear()
+        with self._lock:
+            self._frames.clear()
+
+
+standings_engine = StandingsEngine()
+
+
+def driver_standings(season):
+    """Return the drivers' championship standings for a season."""
+    return standings_engine.standings('driver_id', season)
+
+
+def constructor_standings(season):
+    """Return the constructors' championship standings for a season."""
+    return standings_engine.standings('constructor_id', season)
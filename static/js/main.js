@@ -63,6 +63,9 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // Add racing line effects to cards
     addRacingLineEffects();
+
+    // Typeahead for the navbar search box
+    initSiteSearch();
 });
 
 /**
@@ -143,4 +146,77 @@ function addRacingLineEffects() {
             }
         });
     });
-}
\ No newline at end of file
+}
+
+/**
+ * Show search suggestions under the navbar search box as the user types
+ */
+function initSiteSearch() {
+    const input = document.getElementById('site-search');
+    const menu = document.getElementById('site-search-menu');
+    if (!input || !menu) {
+        return;
+    }
+
+    const icons = {
+        driver: 'fa-user',
+        constructor: 'fa-car',
+        race: 'fa-flag-checkered',
+        circuit: 'fa-road'
+    };
+    let timer = null;
+    let controller = null;
+
+    function hide() {
+        menu.classList.remove('show');
+        menu.innerHTML = '';
+    }
+
+    function render(results) {
+        menu.innerHTML = '';
+        results.forEach(result => {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.className = 'dropdown-item';
+            link.href = result.url;
+            const icon = document.createElement('i');
+            icon.className = `fas ${icons[result.kind] || 'fa-search'} me-2 text-muted`;
+            link.appendChild(icon);
+            link.appendChild(document.createTextNode(result.label));
+            item.appendChild(link);
+            menu.appendChild(item);
+        });
+        menu.classList.toggle('show', results.length > 0);
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            hide();
+            return;
+        }
+        timer = setTimeout(() => {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(`${input.dataset.endpoint}?limit=8&q=${encodeURIComponent(query)}`, { signal: controller.signal })
+                .then(response => response.json())
+                .then(render)
+                .catch(() => {});
+        }, 100);
+    });
+
+    input.addEventListener('keydown', function (event) {
+        if (event.key === 'Escape') {
+            hide();
+        }
+    });
+
+    document.addEventListener('click', function (event) {
+        if (!menu.contains(event.target) && event.target !== input) {
+            hide();
+        }
+    });
+}
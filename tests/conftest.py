@@ -0,0 +1,41 @@
+"""
+Shared fixtures: an app whose database is ingested from a temporary copy of
+a few real race folders, which tests may rename, edit or delete.
+"""
+import os
+import shutil
+
+import pytest
+
+from app import create_app
+from config import Config
+from models import db
+
+RACES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'races')
+RACE_FOLDERS = ['1 bahrain', '2 Saudi Arabia', '3 Australia', '4 Japan', '5 china', '6 miami']
+
+
+@pytest.fixture
+def races_folder(tmp_path):
+    folder = tmp_path / 'races'
+    for name in RACE_FOLDERS:
+        shutil.copytree(os.path.join(RACES, name), folder / name)
+    return folder
+
+
+@pytest.fixture
+def app(tmp_path, races_folder):
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'local.db'}"
+        RACES_FOLDER = str(races_folder)
+        USE_SNAPSHOT = False
+        WATCH_RACES = False
+        METRICS_ENABLED = False
+        PAGE_CACHE_DIR = None
+        SYNC_CHECKPOINT = str(tmp_path / 'remote-sync.json')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,27 @@
+"""Tests of the JSON API's response cache."""
+from api import response_cache
+
+
+def test_unread_query_args_share_a_cache_entry(app):
+    client = app.test_client()
+    response_cache.clear()
+
+    bodies = [client.get(f'/api/races?season=2024&x={i}').data for i in range(5)]
+    assert response_cache.stats()['entries'] == 1
+    assert len(set(bodies)) == 1
+
+    client.get('/api/races?x=1&season=2024')
+    assert response_cache.stats()['entries'] == 1
+    client.get('/api/races')
+    assert response_cache.stats()['entries'] == 2
+
+
+def test_read_query_args_are_cached_separately(app):
+    client = app.test_client()
+    response_cache.clear()
+
+    miami = client.get('/api/search?q=miami').json
+    china = client.get('/api/search?q=china').json
+
+    assert miami != china
+    assert response_cache.stats()['entries'] == 2
@@ -0,0 +1,68 @@
+"""Tests of the flag image resolution and the Pillow image build."""
+import os
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import assets
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    for folder, name, color in (('flags', 'bahrain.png', 'red'), ('tracks', 'bahrain.png', 'blue'),
+                                ('flags', 'jap.png', 'white'), ('tracks', 'monaco.png', 'green')):
+        os.makedirs(tmp_path / 'img' / folder, exist_ok=True)
+        Image.new('RGB', (360, 240), color).save(tmp_path / 'img' / folder / name)
+    return tmp_path
+
+
+def race(name):
+    return SimpleNamespace(name=name)
+
+
+def test_flags_resolve_through_aliases_then_tracks(static_folder):
+    manifest = assets.AssetManifest().load(str(static_folder))
+
+    assert manifest.flag('Bahrain') == 'img/flags/bahrain.png'
+    assert manifest.flag('Japan') == 'img/flags/jap.png'
+    assert manifest.flag('Monaco') == 'img/tracks/monaco.png'
+    assert manifest.flag('Atlantis') == assets.PLACEHOLDER
+
+
+def test_build_writes_a_sprite_sheet_with_a_class_per_image(static_folder):
+    build = assets.build_images(str(static_folder))
+
+    flags = build['flags']
+    assert sorted(entry['sprite'] for entry in flags.values()) == [
+        'flag-bahrain', 'flag-jap', 'track-bahrain', 'track-monaco']
+
+    with Image.open(static_folder / build['sprite']) as sprite:
+        assert sprite.size == (4 * assets.SPRITE_CELL[0], assets.SPRITE_CELL[1])
+        # Cells follow the sorted sources: the flag is red, the track blue
+        red, _, blue = sprite.getpixel((assets.SPRITE_CELL[0] // 2, 10))
+        assert red > 200 and blue < 50
+
+    css = (static_folder / build['sprite_css']).read_text()
+    positions = dict(re.findall(r'\.flag-sprite-([\w-]+)\{background-position:(-?\d+)px', css))
+    assert sorted(positions) == sorted(entry['sprite'] for entry in flags.values())
+    assert len(set(positions.values())) == len(positions)
+    assert os.path.basename(build['sprite']) in css
+
+    for entry in flags.values():
+        for widths in entry['thumbnails'].values():
+            for path in widths.values():
+                assert (static_folder / path).exists()
+
+
+def test_races_get_the_built_assets_of_their_flag(static_folder):
+    assets.build_images(str(static_folder))
+    manifest = assets.AssetManifest().load(str(static_folder))
+
+    bahrain = manifest.for_race(race('Bahrain'))
+    assert bahrain.sprite_class == 'flag-sprite-flag-bahrain'
+    assert set(bahrain.thumbnails['webp']) == {str(width) for width in assets.THUMBNAIL_WIDTHS}
+    assert manifest.for_race(race('Monaco')).sprite_class == 'flag-sprite-track-monaco'
+    assert manifest.for_race(race('Atlantis')).sprite_class is None
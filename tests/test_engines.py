@@ -0,0 +1,63 @@
+"""
+Tests of the standings, comparison, pit stop and simulator engines, which
+share utils.VersionedCache: results are reused until a race changes.
+"""
+import pytest
+
+from compare import comparison_index
+from pitstops import season_pit_stops
+from simulator import rules_from_args, simulator_engine, what_if
+from standings import driver_standings
+from utils import VersionedCache, load_races_data, race_keys
+
+
+def test_race_keys_are_in_calendar_order(app):
+    keys = race_keys(2024)
+    assert [race.race_number for race, _ in keys] == [1, 2, 3, 4, 5, 6]
+    assert all(content_hash for _, content_hash in keys)
+    assert race_keys(race_id=keys[2][0].race_id) == [keys[2]]
+
+
+def test_versioned_cache_rebuilds_only_on_change():
+    cache = VersionedCache()
+    builds = []
+
+    def build(previous):
+        builds.append(previous)
+        return len(builds)
+
+    first = [('race', 'hash')]
+    assert cache.get('key', first, build) == 1
+    assert cache.get('key', list(first), build) == 1
+    assert cache.get('key', [('race', 'changed')], build) == 2
+    assert builds == [(), tuple(first)]
+
+
+ENGINES = {
+    'standings': lambda: driver_standings(2024),
+    'compare': lambda: comparison_index.postings('driver_id', 2024),
+    'pit stops': lambda: season_pit_stops(2024),
+    'simulator': lambda: simulator_engine.matrix(2024),
+}
+
+
+@pytest.mark.parametrize('name', ENGINES)
+def test_engine_reuses_results_until_a_race_changes(app, races_folder, name):
+    result = ENGINES[name]
+    first = result()
+    assert result() is first
+
+    (races_folder / '6 miami' / 'pit-stops.yml').unlink()
+    load_races_data(str(races_folder))
+
+    assert result() is not first
+
+
+def test_standings_follow_changed_results(app, races_folder):
+    before = {row['id']: row['points'] for row in driver_standings(2024).rows}
+    (races_folder / '6 miami' / 'race-results.yml').unlink()
+    load_races_data(str(races_folder))
+
+    after = {row['id']: row['points'] for row in driver_standings(2024).rows}
+    assert sum(after.values()) < sum(before.values())
+    assert {row['id']: row['points'] for row in what_if(2024, rules_from_args({}), 'drivers')} == after
@@ -0,0 +1,55 @@
+"""Tests of freeze.freeze and its incremental manifest."""
+import json
+import os
+
+import pytest
+
+import freeze
+from models import Race, db
+
+
+@pytest.fixture
+def output(tmp_path):
+    return str(tmp_path / 'site')
+
+
+def manifest(output):
+    with open(os.path.join(output, freeze.MANIFEST)) as f:
+        return json.load(f)
+
+
+def test_freeze_writes_every_page(app, output):
+    rendered, removed, failed = freeze.freeze(app, output, workers=2)
+
+    assert failed == [] and removed == []
+    assert sorted(rendered) == sorted(manifest(output))
+    for url in rendered:
+        assert os.path.exists(freeze.page_path(output, url)), url
+    assert os.path.exists(os.path.join(output, '404.html'))
+
+
+def test_rerun_only_renders_changed_pages(app, output):
+    freeze.freeze(app, output, workers=2)
+    assert freeze.freeze(app, output, workers=2)[0] == []
+
+    race = Race.query.filter_by(folder_name='4 Japan').one()
+    race.circuit_name = 'Suzuka'
+    db.session.commit()
+    rendered, _, failed = freeze.freeze(app, output, workers=2)
+
+    assert failed == []
+    assert f'/race/{race.id}' in rendered
+    assert '/' not in rendered and '/404.html' not in rendered
+
+
+def test_missing_page_is_a_failure_left_out_of_the_manifest(app, output, monkeypatch):
+    site_pages = freeze.site_pages
+    monkeypatch.setattr(freeze, 'site_pages', lambda app: {**site_pages(app), '/race/9999': 'v'})
+
+    rendered, _, failed = freeze.freeze(app, output, workers=2)
+
+    assert failed == [('/race/9999', 404)]
+    assert '/race/9999' not in rendered and '/race/9999' not in manifest(output)
+    assert '/404.html' in rendered
+    # Still stale, so the next run tries it again
+    assert freeze.freeze(app, output, workers=2)[2] == [('/race/9999', 404)]
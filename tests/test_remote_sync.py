@@ -0,0 +1,135 @@
+"""
+Tests of remote_sync.push against a SQLite file standing in for the remote
+database.
+"""
+import os
+import shutil
+
+import pytest
+from sqlalchemy import select
+
+import remote_sync
+from conftest import RACE_FOLDERS
+from models import Race, db
+from utils import load_races_data
+
+# Small enough that every race is a batch of its own
+BATCH_ROWS = 50
+
+
+@pytest.fixture
+def target(tmp_path):
+    target = remote_sync.SqlTarget(f"sqlite:///{tmp_path / 'remote.db'}")
+    yield target
+    target.close()
+
+
+def push(app, target, **kwargs):
+    return remote_sync.push(target, remote_sync.checkpoint_path(app), BATCH_ROWS, **kwargs)
+
+
+def table_rows(engine, model):
+    table = model.__table__
+    with engine.connect() as connection:
+        return connection.execute(select(table).order_by(*table.primary_key.columns)).all()
+
+
+def assert_in_sync(target):
+    for model in remote_sync.SYNC_MODELS:
+        assert table_rows(target.engine, model) == table_rows(db.engine, model), model.__tablename__
+
+
+def count_writes(target):
+    calls = []
+    write = target.write
+
+    def counted(batch):
+        calls.append(sorted(batch.versions))
+        write(batch)
+
+    target.write = counted
+    return calls
+
+
+def test_backfill_copies_every_table(app, target):
+    result = push(app, target)
+
+    assert result.races == len(RACE_FOLDERS)
+    assert result.batches == len(RACE_FOLDERS)
+    assert result.deleted == 0
+    assert_in_sync(target)
+
+
+def test_interrupted_backfill_resumes_from_checkpoint(app, target):
+    write = target.write
+    calls = []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) == 3:
+            raise ConnectionError('network down')
+        write(batch)
+
+    target.write = flaky
+    with pytest.raises(ConnectionError):
+        push(app, target)
+
+    checkpointed = remote_sync.read_checkpoint(remote_sync.checkpoint_path(app), target.name)
+    assert 2 <= len(checkpointed) < len(RACE_FOLDERS)
+
+    target.write = write
+    writes = count_writes(target)
+    result = push(app, target)
+
+    assert result.races == len(RACE_FOLDERS) - len(checkpointed)
+    assert not {race_id for batch in writes for race_id in batch} & set(checkpointed)
+    assert_in_sync(target)
+
+
+def test_repeat_push_is_a_no_op(app, target):
+    push(app, target)
+    writes = count_writes(target)
+
+    assert push(app, target) == remote_sync.SyncResult(0, 0, 0, 0)
+    assert writes == []
+    assert_in_sync(target)
+
+
+def test_changed_race_is_pushed_again(app, target, races_folder):
+    push(app, target)
+    os.remove(races_folder / '3 Australia' / 'pit-stops.yml')
+    load_races_data(str(races_folder))
+    race = Race.query.filter_by(folder_name='4 Japan').one()
+    race.circuit_name = 'Suzuka'
+    db.session.commit()
+    writes = count_writes(target)
+
+    result = push(app, target)
+
+    assert result.races == 2
+    changed = db.session.execute(
+        select(Race.id).where(Race.folder_name.in_(['3 Australia', '4 Japan']))).scalars().all()
+    assert sorted(race_id for batch in writes for race_id in batch) == sorted(changed)
+    assert_in_sync(target)
+
+
+def test_deleted_race_is_deleted_from_target(app, target, races_folder):
+    push(app, target)
+    shutil.rmtree(races_folder / '5 china')
+    load_races_data(str(races_folder))
+
+    result = push(app, target)
+
+    assert (result.races, result.deleted) == (0, 1)
+    assert_in_sync(target)
+
+
+def test_full_push_still_deletes_races_removed_locally(app, target, races_folder):
+    push(app, target)
+    shutil.rmtree(races_folder / '5 china')
+    load_races_data(str(races_folder))
+
+    result = push(app, target, full=True)
+
+    assert (result.races, result.deleted) == (len(RACE_FOLDERS) - 1, 1)
+    assert_in_sync(target)
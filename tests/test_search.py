@@ -0,0 +1,58 @@
+"""Tests of the search index and its refresh when the races change."""
+import pytest
+
+import search
+from models import Race, db
+from search import search_index
+
+
+@pytest.fixture
+def data_version_calls(monkeypatch):
+    calls = []
+
+    def counted(*args):
+        calls.append(args)
+        return data_version(*args)
+
+    data_version = search.data_version
+    monkeypatch.setattr(search, 'data_version', counted)
+    return calls
+
+
+def labels(query):
+    return [result.label for result in search.search(query)]
+
+
+def test_prefix_and_typo_matches(app):
+    assert '2024 China' in labels('chin')
+    assert '2024 Australia' in labels('austrelia')
+
+
+def test_index_refreshes_when_the_races_change(app, monkeypatch):
+    monkeypatch.setattr(search_index, 'check_interval', 0)
+    race = Race.query.filter_by(folder_name='5 china').one()
+    race.name = 'Shanghai'
+    db.session.commit()
+
+    assert '2024 Shanghai' in labels('shanghai')
+
+
+def test_queries_between_checks_skip_the_database(app, monkeypatch, data_version_calls):
+    monkeypatch.setattr(search_index, 'check_interval', 60)
+    search_index.refresh()
+    del data_version_calls[:]
+
+    for query in ('bahrain', 'japan', 'verstappen'):
+        assert search.search(query)
+    assert data_version_calls == []
+
+
+def test_api_search_checks_the_data_once(app, monkeypatch, data_version_calls):
+    monkeypatch.setattr(search_index, 'check_interval', 0)
+    del data_version_calls[:]
+
+    response = app.test_client().get('/api/search?q=miami')
+
+    assert response.status_code == 200
+    assert [result['label'] for result in response.json] == ['2024 Miami', 'Miami']
+    assert len(data_version_calls) == 1
@@ -0,0 +1,52 @@
+"""Tests of the what-if rules and re-scoring."""
+import pytest
+
+from simulator import POINTS_SYSTEMS, rules_from_args, what_if
+from standings import constructor_standings, driver_standings
+
+
+def test_default_rules_reproduce_the_real_standings(app):
+    for kind, table in (('drivers', driver_standings), ('constructors', constructor_standings)):
+        actual = {row['id']: row['points'] for row in table(2024).rows}
+        rescored = {row['id']: row['points'] for row in what_if(2024, rules_from_args({}), kind)}
+        assert rescored == actual
+
+
+def test_fastest_lap_defaults_to_the_system_point():
+    assert rules_from_args({}).fastest_lap == 1
+    assert rules_from_args({'system': '2010'}).fastest_lap == 0
+    assert rules_from_args({'points': '3,2,1'}).fastest_lap == 0
+    assert rules_from_args({'system': '2019', 'fastest_lap': '0'}).fastest_lap == 0
+    assert rules_from_args({'system': '1991'}).points == POINTS_SYSTEMS['1991']
+
+
+@pytest.mark.parametrize('args', [
+    {'points': 'nan'},
+    {'points': '25,inf'},
+    {'points': '25,-1'},
+    {'points': '25,x'},
+    {'points': ','.join(['1'] * 41)},
+    {'fastest_lap': 'nan'},
+    {'fastest_lap': 'inf'},
+    {'fastest_lap': '-1'},
+    {'best': '0'},
+    {'system': '1066'},
+])
+def test_malformed_rules_are_rejected(args):
+    with pytest.raises(ValueError):
+        rules_from_args(args)
+
+
+@pytest.mark.parametrize('query', ['points=nan', 'points=25,inf', 'fastest_lap=nan', 'system=1066'])
+def test_api_rejects_malformed_rules(app, query):
+    response = app.test_client().get(f'/api/what-if/drivers?season=2024&{query}')
+
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_page_ignores_a_non_finite_dnf_rate(app):
+    response = app.test_client().get('/what-if?trials=100&dnf_rate=nan')
+
+    assert response.status_code == 200
+    assert b'retiring with probability 0.1' in response.data
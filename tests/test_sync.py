@@ -0,0 +1,63 @@
+"""Tests of utils.load_races_data, the incremental sync of the races folder."""
+import os
+import shutil
+
+from sqlalchemy import func, select
+
+from conftest import RACE_FOLDERS
+from models import Race, RaceManifest, RaceResult, db
+from utils import load_races_data
+
+
+def races():
+    return {race.folder_name: race.id for race in Race.query.all()}
+
+
+def result_count(race_id):
+    return db.session.execute(
+        select(func.count()).select_from(RaceResult).where(RaceResult.race_id == race_id)).scalar()
+
+
+def test_startup_ingests_every_folder(app):
+    assert sorted(races()) == sorted(RACE_FOLDERS)
+    assert all(result_count(race_id) for race_id in races().values())
+
+
+def test_unchanged_folder_is_skipped(app, races_folder):
+    assert load_races_data(str(races_folder)).skipped
+
+
+def test_changed_folder_is_reingested(app, races_folder):
+    race_id = races()['3 Australia']
+    os.remove(races_folder / '3 Australia' / 'race-results.yml')
+
+    result = load_races_data(str(races_folder))
+
+    assert [race.id for race in result.updated] == [race_id]
+    assert result_count(race_id) == 0
+
+
+def test_deleted_folder_deletes_its_race(app, races_folder):
+    race_id = races()['5 china']
+    shutil.rmtree(races_folder / '5 china')
+
+    result = load_races_data(str(races_folder))
+
+    assert [race.id for race in result.deleted] == [race_id]
+    assert '5 china' not in races()
+    assert result_count(race_id) == 0
+
+
+def test_renamed_folder_keeps_its_race(app, races_folder):
+    before = races()
+    count = result_count(before['5 china'])
+    os.rename(races_folder / '5 china', races_folder / '5 China')
+
+    result = load_races_data(str(races_folder))
+
+    assert (len(result.inserted), len(result.updated), len(result.deleted)) == (0, 1, 0)
+    after = races()
+    assert after['5 China'] == before['5 china'] and '5 china' not in after
+    assert result_count(after['5 China']) == count
+    assert RaceManifest.query.filter_by(folder_name='5 china').first() is None
+    assert load_races_data(str(races_folder)).skipped
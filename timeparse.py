@@ -0,0 +1,86 @@
+"""
+Parse race time strings into integer milliseconds.
+
+The YAML files store every time as text: lap and qualifying times
+('1:32.608', '36.604'), race times ('1:31:44.742'), gaps and intervals
+('+22.457', '+1:02.345') and time penalties ('5.000'). Gaps of whole laps
+('+1 lap', '+2 laps') are not times and parse to None.
+
+Ingest stores the parsed values next to the display strings (time_ms,
+gap_ms, ... columns and int32 snapshot columns) so sorting and arithmetic
+never go back to the strings.
+"""
+import re
+from array import array
+
+import numpy as np
+
+# Fields holding a time string, by YAML key
+TIME_FIELDS = ('time', 'gap', 'interval', 'timePenalty')
+
+# Marks a missing time in int32 arrays (same value as snapshot.NONE)
+NO_TIME = -2 ** 31
+
+_TIME_RE = re.compile(r'^\+?(?:(?:(\d+):)?(\d+):)?(\d+)(?:\.(\d{1,3}))?$')
+
+
+def parse_ms(value):
+    """
+    Return a time string as integer milliseconds, or None.
+
+    None, empty strings and lap gaps such as '+1 lap' give None. Numbers are
+    taken as seconds.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value * 1000))
+    match = _TIME_RE.match(value.strip())
+    if match is None:
+        return None
+    hours, minutes, seconds, fraction = match.groups()
+    ms = int(seconds) * 1000
+    if fraction:
+        ms += int(fraction.ljust(3, '0'))
+    if minutes:
+        ms += int(minutes) * 60000
+    if hours:
+        ms += int(hours) * 3600000
+    return ms
+
+
+def ms_array(values):
+    """Parse a sequence of time strings into an array('i'), NO_TIME for missing."""
+    parsed = array('i')
+    for value in values:
+        ms = parse_ms(value)
+        parsed.append(NO_TIME if ms is None else ms)
+    return parsed
+
+
+def to_numpy(times):
+    """
+    Return int32 milliseconds (an array('i'), memoryview or list of ints and
+    None) as a float64 NumPy array with NaN for missing times.
+    """
+    if isinstance(times, list):
+        times = array('i', (NO_TIME if ms is None else ms for ms in times))
+    values = np.frombuffer(times, dtype=np.int32).astype(np.float64)
+    values[values == NO_TIME] = np.nan
+    return values
+
+
+def format_ms(ms, sign=False):
+    """Format milliseconds as '1:32.608' ('1:31:44.742' past an hour); None gives None."""
+    if ms is None:
+        return None
+    hours, rest = divmod(int(ms), 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, millis = divmod(rest, 1000)
+    if hours:
+        text = f'{hours}:{minutes:02d}:{seconds:02d}.{millis:03d}'
+    elif minutes:
+        text = f'{minutes}:{seconds:02d}.{millis:03d}'
+    else:
+        text = f'{seconds}.{millis:03d}'
+    return '+' + text if sign else text
@@ -1,81 +1,383 @@
+import hashlib
 import os
-import yaml
 import re
-from models import Race, db
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import delete, func, insert, select
+from flask import current_app
+from models import (Race, RaceManifest, RaceResult, FastestLap, PitStop, GridPosition, RaceSummary,
+                    RACE_DATA_MODELS, db)
+from cache import parse_yaml_file, race_cache
+from metrics import LOADER_SECONDS
+import snapshot
 
 
-def load_races_data(races_folder):
-    """Load races data from the races folder and populate the database, avoiding duplicates by folder_name and (race_number, name)."""
-    import datetime
-    races = []
+SyncResult = namedtuple('SyncResult', ['inserted', 'updated', 'deleted', 'skipped'])
 
-    # List all race directories
-    for item in os.listdir(races_folder):
-        # Skip non-directory items and 'uploads' directory
-        if not os.path.isdir(os.path.join(races_folder, item)) or item == 'uploads':
+RaceKey = namedtuple('RaceKey', ['race_id', 'season', 'race_number', 'name'])
+
+
+def parse_race_folder(folder_name):
+    """Split a '<number> <name>' folder name into (race_number, race_name), or None."""
+    match = re.match(r'(\d+)\s+(.*)', folder_name)
+    if not match:
+        return None
+    return int(match.group(1)), match.group(2).strip()
+
+
+def name_key(name):
+    """'Great Britain', 'great-britain' and 'great_britain' -> 'greatbritain'."""
+    return name.lower().replace(' ', '').replace('_', '').replace('-', '')
+
+
+def parse_race_path(folder, default_season):
+    """
+    Split a race folder path into (season, race_number, race_name), or None.
+
+    '2024/1 bahrain' belongs to the 2024 season; a flat '1 bahrain' folder
+    belongs to default_season.
+    """
+    season, _, name = folder.rpartition('/')
+    parsed = parse_race_folder(name)
+    if parsed is None:
+        return None
+    if not season:
+        return (default_season,) + parsed
+    if not snapshot.is_season_folder(season):
+        return None
+    return (int(season),) + parsed
+
+
+def load_races_data(races_folder, hashes=None, parsed=None, force=False, default_season=None):
+    """
+    Sync the races folder into the database.
+
+    Folder names and content hashes are compared against the stored
+    RaceManifest; when they match nothing else is read or written. Otherwise
+    existing races are fetched in one query, the diff is computed in memory
+    and inserts, updates and deletes are applied in a single transaction:
+
+    - a new folder inserts a Race, unless a row with the same season,
+      race_number and name_key(name) exists, in which case that row adopts
+      the folder
+    - a folder whose content hash changed has its datasets re-ingested
+    - a folder that was synced before but is gone deletes its Race
+
+    Races that were never synced from a folder are left untouched. With
+    force=True every folder is treated as changed and re-ingested. parsed is
+    passed through to ingest_race_data. Flat '<n> <name>' folders belong to
+    default_season (the DEFAULT_SEASON setting when not given).
+    """
+    if default_season is None:
+        default_season = current_app.config['DEFAULT_SEASON']
+    if hashes is None:
+        hashes = snapshot.folder_hashes(races_folder)
+    paths = {folder: parse_race_path(folder, default_season) for folder in hashes}
+    hashes = {folder: content_hash for folder, content_hash in hashes.items() if paths[folder]}
+
+    manifest = {entry.folder_name: entry for entry in RaceManifest.query.all()}
+    if not force and {folder: entry.content_hash for folder, entry in manifest.items()} == hashes:
+        return SyncResult([], [], [], True)
+
+    races = Race.query.all()
+    by_folder = {race.folder_name: race for race in races}
+    by_number_name = {(race.season, race.race_number, name_key(race.name)): race for race in races}
+
+    inserted, updated, deleted = [], [], []
+    for folder, content_hash in sorted(hashes.items()):
+        entry = manifest.get(folder)
+        if (not force and entry is not None and entry.content_hash == content_hash
+                and folder in by_folder):
             continue
 
-        # Parse race number and name
-        match = re.match(r'(\d+)\s+(.*)', item)
-        if match:
-            race_number = int(match.group(1))
-            race_name = match.group(2).strip()
-            # Try to infer the date from the folder name (optional, fallback to None)
-            race_date = None
-            # Check for duplicates by folder_name and (race_number, name)
-            existing_by_folder = Race.query.filter_by(folder_name=item).first()
-            existing_by_number_name = Race.query.filter_by(race_number=race_number, name=race_name).first()
-            if not existing_by_folder and not existing_by_number_name:
-                # Create new race entry
+        race = by_folder.get(folder)
+        if race is None:
+            season, race_number, race_name = paths[folder]
+            race = by_number_name.get((season, race_number, name_key(race_name)))
+            if race is not None and race.folder_name not in hashes:
+                # The row moves to the new folder; its old folder is only forgotten
+                by_folder.pop(race.folder_name, None)
+                race.folder_name = folder
+            elif race is None:
                 race = Race(
                     name=race_name,
-                    folder_name=item,
+                    folder_name=folder,
                     race_number=race_number,
                     circuit_name=race_name,  # Default to race name, could be updated later
-                    date=race_date
+                    date=None,
+                    season=season
                 )
                 db.session.add(race)
-                races.append(race)
+                inserted.append(race)
             else:
-                print(f"Skipping duplicate: {item} ({race_name}, {race_number})")
+                print(f"Skipping duplicate: {folder} ({race_name}, {race_number})")
+                race = None
+            if race is not None:
+                by_folder[folder] = race
 
-    if races:
-        db.session.commit()
+        if race is not None and race not in inserted:
+            updated.append(race)
+        if entry is None:
+            db.session.add(RaceManifest(folder_name=folder, content_hash=content_hash))
+        else:
+            entry.content_hash = content_hash
+
+    for folder, entry in manifest.items():
+        if folder in hashes:
+            continue
+        race = by_folder.get(folder)
+        if race is not None:
+            db.session.delete(race)
+            deleted.append(race)
+        db.session.delete(entry)
+
+    db.session.flush()
+    ingest_race_data(races_folder, inserted + updated, commit=False, parsed=parsed)
+    db.session.commit()
+
+    return SyncResult(inserted, updated, deleted, False)
+
+
+def _fingerprint_rows(rows):
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(repr(tuple(row)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _race_fingerprint_query():
+    return (select(Race.id, Race.name, Race.folder_name, Race.race_number,
+                   Race.circuit_name, Race.date, Race.season, RaceManifest.content_hash)
+            .outerjoin(RaceManifest, RaceManifest.folder_name == Race.folder_name))
+
+
+def race_fingerprint(race_id):
+    """Return a fingerprint of one race's row and data files, or None if it doesn't exist."""
+    rows = db.session.execute(_race_fingerprint_query().where(Race.id == race_id)).all()
+    return _fingerprint_rows(rows) if rows else None
+
+
+def race_fingerprints():
+    """Return {race id: race_fingerprint(race id)} for every race in one query."""
+    rows = db.session.execute(_race_fingerprint_query()).all()
+    return {row[0]: _fingerprint_rows([row]) for row in rows}
+
+
+def data_version(season=None):
+    """Return a fingerprint of every Race row (optionally of one season) and the data files behind it."""
+    query = _race_fingerprint_query()
+    if season is not None:
+        query = query.where(Race.season == season)
+    rows = db.session.execute(query.order_by(Race.id)).all()
+    return _fingerprint_rows(rows)
+
+
+def race_keys(season=None, race_id=None):
+    """
+    Return [(RaceKey, content hash)] in calendar order for every race, one
+    season's races or one race. The content hash is None for a race with no
+    synced folder.
+    """
+    query = (select(Race.id, Race.season, Race.race_number, Race.name, RaceManifest.content_hash)
+             .outerjoin(RaceManifest, RaceManifest.folder_name == Race.folder_name))
+    if season is not None:
+        query = query.where(Race.season == season)
+    if race_id is not None:
+        query = query.where(Race.id == race_id)
+    rows = db.session.execute(query.order_by(Race.season, Race.race_number, Race.id)).all()
+    return [(RaceKey(*row[:4]), row[4]) for row in rows]
 
-    return races
+
+class VersionedCache:
+    """
+    Values built from a list of races, such as one season's, kept until the
+    races or their content hashes change. The analytics engines keep their
+    per-season structures in one.
+    """
+
+    def __init__(self, lock=None):
+        # Engines pass their own lock when build touches state they share
+        self._lock = lock or threading.Lock()
+        self._entries = {}
+
+    def get(self, key, current, build):
+        """
+        Return the value cached under key for current, a race_keys() list.
+        When current differs from the list it was built from, build(previous)
+        is called with that list (empty the first time) to rebuild it.
+        """
+        version = tuple(current)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != version:
+                cached = self._entries[key] = (version, build(cached[0] if cached else ()))
+            return cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+def race_seasons():
+    """Return the seasons that have races, newest first."""
+    return db.session.execute(
+        select(Race.season).distinct().order_by(Race.season.desc())).scalars().all()
+
+
+def _load_race_file(race_folder, filename):
+    """
+    Load a parsed race file through the LRU cache; a miss decodes it from
+    the snapshot, falling back to parsing the YAML.
+    """
+    start = time.perf_counter()
+    source = 'cache'
+
+    def parse(path):
+        nonlocal source
+        race_snapshot = snapshot.current()
+        rows = race_snapshot.load(race_folder, filename) if race_snapshot is not None else None
+        if rows is not None:
+            source = 'snapshot'
+            return rows
+        source = 'yaml'
+        return parse_yaml_file(path)
+
+    data = race_cache.load(race_folder, filename, parse)
+    LOADER_SECONDS.observe(time.perf_counter() - start, filename, source)
+    return data if data is not None else []
 
 
 def load_race_results(race_folder):
     """Load race results from a specific race folder."""
-    results_file = os.path.join(race_folder, 'race-results.yml')
-    if os.path.exists(results_file):
-        with open(results_file, 'r') as f:
-            return yaml.safe_load(f)
-    return []
+    return _load_race_file(race_folder, 'race-results.yml')
 
 
 def load_fastest_laps(race_folder):
     """Load fastest laps data from a specific race folder."""
-    laps_file = os.path.join(race_folder, 'fastest-laps.yml')
-    if os.path.exists(laps_file):
-        with open(laps_file, 'r') as f:
-            return yaml.safe_load(f)
-    return []
+    return _load_race_file(race_folder, 'fastest-laps.yml')
 
 
 def load_pit_stops(race_folder):
     """Load pit stops data from a specific race folder."""
-    pit_stops_file = os.path.join(race_folder, 'pit-stops.yml')
-    if os.path.exists(pit_stops_file):
-        with open(pit_stops_file, 'r') as f:
-            return yaml.safe_load(f)
-    return []
+    return _load_race_file(race_folder, 'pit-stops.yml')
 
 
 def load_grid_positions(race_folder):
     """Load starting grid positions from a specific race folder."""
-    grid_file = os.path.join(race_folder, 'starting-grid-positions.yml')
-    if os.path.exists(grid_file):
-        with open(grid_file, 'r') as f:
-            return yaml.safe_load(f)
-    return []
+    return _load_race_file(race_folder, 'starting-grid-positions.yml')
+
+
+# Dataset model -> loader for its YAML file
+RACE_DATA_LOADERS = (
+    (RaceResult, load_race_results),
+    (FastestLap, load_fastest_laps),
+    (PitStop, load_pit_stops),
+    (GridPosition, load_grid_positions),
+)
+
+
+def race_data_records(race_folder):
+    """
+    Parse a race folder into compact {table name: [row tuples]} records.
+
+    Tuples follow each model's insert_columns() order, so they are cheap to
+    pickle between processes.
+    """
+    return {model.__tablename__: [model.record_values(record) for record in loader(race_folder) or []]
+            for model, loader in RACE_DATA_LOADERS}
+
+
+def ingest_race_data(races_folder, races, commit=True, parsed=None):
+    """
+    Bulk load the four per-race datasets for the given races.
+
+    Existing rows for those races are replaced. Every table is filled with a
+    single executemany-style insert and the whole load commits as one
+    transaction (pass commit=False to fold it into the caller's). parsed may
+    map folder names to race_data_records() output that was produced
+    elsewhere, e.g. by the ingest.py process pool; other folders are parsed
+    here.
+    """
+    rows = {model: [] for model in RACE_DATA_MODELS}
+    for race in races:
+        records = (parsed or {}).get(race.folder_name)
+        if records is None:
+            records = race_data_records(os.path.join(races_folder, race.folder_name))
+        for model in RACE_DATA_MODELS:
+            columns = model.insert_columns()
+            rows[model].extend(dict(zip(columns, values), race_id=race.id)
+                               for values in records[model.__tablename__])
+
+    race_ids = [race.id for race in races]
+    if race_ids:
+        for model in RACE_DATA_MODELS:
+            db.session.execute(delete(model).where(model.race_id.in_(race_ids)))
+            if rows[model]:
+                db.session.execute(insert(model), rows[model])
+        refresh_race_summaries(race_ids)
+    if commit:
+        db.session.commit()
+
+    return {model.__tablename__: len(model_rows) for model, model_rows in rows.items()}
+
+
+# Race results whose position_text counts as a retirement
+RETIRED = ('DNF',)
+
+
+def refresh_race_summaries(race_ids):
+    """
+    Rebuild the RaceSummary rows of some races from their datasets, in the
+    caller's transaction. Reads only the winner, pole and fastest lap rows
+    through the (race_id, position) indexes, plus one grouped count per
+    dataset. Returns the number of summaries written.
+    """
+    empty = {column.name: None for column in RaceSummary.__table__.columns}
+    empty.update(classified=0, retirements=0, pit_stops=0)
+    summaries = {race_id: dict(empty, race_id=race_id) for race_id in race_ids}
+    if not summaries:
+        return 0
+
+    leaders = (
+        (RaceResult, 'winner', RaceResult.time, [RaceResult.constructor_id]),
+        (GridPosition, 'pole', GridPosition.time, [GridPosition.constructor_id]),
+        (FastestLap, 'fastest_lap', FastestLap.time, [FastestLap.lap]),
+    )
+    for model, prefix, time_column, extra in leaders:
+        query = (select(model.race_id, model.driver_id, time_column, *extra)
+                 .where(model.race_id.in_(race_ids), model.position == 1)
+                 .order_by(model.race_id, model.id))
+        for race_id, driver_id, time_value, extra_value in db.session.execute(query):
+            summary = summaries[race_id]
+            if summary[f'{prefix}_driver_id'] is not None:
+                continue
+            summary[f'{prefix}_driver_id'] = driver_id
+            summary[f'{prefix}_time'] = time_value
+            summary[f'{prefix}_lap' if model is FastestLap else f'{prefix}_constructor_id'] = extra_value
+
+    counts = (
+        ('classified', select(RaceResult.race_id, func.count())
+         .where(RaceResult.race_id.in_(race_ids), RaceResult.position.isnot(None))),
+        ('retirements', select(RaceResult.race_id, func.count())
+         .where(RaceResult.race_id.in_(race_ids), RaceResult.position_text.in_(RETIRED))),
+        ('pit_stops', select(PitStop.race_id, func.count()).where(PitStop.race_id.in_(race_ids))),
+    )
+    for name, query in counts:
+        for race_id, count in db.session.execute(query.group_by(query.selected_columns[0])):
+            summaries[race_id][name] = count
+
+    db.session.execute(delete(RaceSummary).where(RaceSummary.race_id.in_(race_ids)))
+    db.session.execute(insert(RaceSummary), list(summaries.values()))
+    return len(summaries)
+
+
+def backfill_race_summaries():
+    """Summarize races that have no RaceSummary yet, e.g. ingested before the table existed."""
+    missing = db.session.execute(
+        select(Race.id).outerjoin(RaceSummary, RaceSummary.race_id == Race.id)
+        .where(RaceSummary.race_id.is_(None))).scalars().all()
+    if missing:
+        refresh_race_summaries(missing)
+        db.session.commit()
+    return len(missing)
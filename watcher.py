@@ -0,0 +1,117 @@
+"""
+Background hot-reload of the races folder.
+
+A daemon thread polls the mtimes and sizes of the race folders and their
+YAML files. Once a change has settled (the tree looks the same on two
+consecutive polls) it runs the manifest sync, which applies every insert,
+update and delete in one transaction, and then swaps in a rebuilt snapshot.
+Page, API and standings caches are keyed on data fingerprints, so they pick
+up the new season as soon as the transaction commits.
+"""
+import os
+import threading
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db
+from search import search_index
+from snapshot import ensure_snapshot, folder_hashes, is_season_folder, snapshot_path
+from utils import load_races_data
+
+
+def _folder_signature(name, path):
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.yml'):
+                stat = entry.stat()
+                files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return (name, os.stat(path).st_mtime_ns, tuple(sorted(files)))
+
+
+def tree_signature(races_folder):
+    """Return the (name, mtime, size) of every season folder, race folder and data file."""
+    signature = []
+    with os.scandir(races_folder) as folders:
+        for folder in folders:
+            if folder.name == 'uploads' or not folder.is_dir():
+                continue
+            if not is_season_folder(folder.name):
+                signature.append(_folder_signature(folder.name, folder.path))
+                continue
+            signature.append((folder.name, folder.stat().st_mtime_ns, ()))
+            with os.scandir(folder.path) as races:
+                for race in races:
+                    if race.is_dir():
+                        signature.append(_folder_signature(f'{folder.name}/{race.name}', race.path))
+    return tuple(sorted(signature))
+
+
+class RacesWatcher:
+    """Poll RACES_FOLDER and sync changes into the database and caches."""
+
+    def __init__(self, app, interval=5.0):
+        self.app = app
+        self.interval = interval
+        self.races_folder = app.config['RACES_FOLDER']
+        self._stop = threading.Event()
+        self._thread = None
+        self._applied = None
+        self._pending = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._applied = tree_signature(self.races_folder)
+        self._thread = threading.Thread(target=self._run, name='races-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                self.app.logger.exception('Race folder sync failed; retrying on next poll')
+
+    def poll(self):
+        """Check the tree once; returns True if a sync was applied."""
+        signature = tree_signature(self.races_folder)
+        if signature == self._applied:
+            self._pending = None
+            return False
+        if signature != self._pending:
+            # Wait for the tree to settle before reading half-copied folders
+            self._pending = signature
+            return False
+
+        self.reload()
+        self._applied = signature
+        self._pending = None
+        return True
+
+    def reload(self):
+        """Sync the races folder into the Race table and swap in a new snapshot."""
+        with self.app.app_context():
+            hashes = folder_hashes(self.races_folder)
+            try:
+                result = load_races_data(self.races_folder, hashes)
+            except (IntegrityError, OperationalError):
+                # Another worker applied the same sync first
+                db.session.rollback()
+                result = load_races_data(self.races_folder, hashes)
+            if self.app.config['USE_SNAPSHOT']:
+                ensure_snapshot(self.races_folder, snapshot_path(self.app), hashes)
+            # A skipped sync may be one another worker applied first; the
+            # refresh only re-reads races whose content hash changed
+            search_index.refresh()
+            if not result.skipped:
+                self.app.logger.info(
+                    'Races folder reloaded: %d inserted, %d updated, %d deleted',
+                    len(result.inserted), len(result.updated), len(result.deleted))
+            return result